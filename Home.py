@@ -1,10 +1,14 @@
 import streamlit as st
-from PIL import Image
+
+from currycompany.warmup import ensure_warmup
 
 st.set_page_config(
     page_title='Home'
 )
 
+# Aquece dados e relatórios das páginas enquanto o visitante está na Home
+ensure_warmup()
+
 st.sidebar.markdown('# Cury Comapny')
 st.sidebar.markdown('## Fastest delivery in Town')
 st.sidebar.markdown("""---""")
@@ -0,0 +1 @@
+""" Benchmarks do dashboard, executados fora do Streamlit. """
@@ -0,0 +1,87 @@
+""" Compara o clean_code vetorizado com a implementação anterior.
+
+    Uso:
+        python -m benchmarks.bench_clean
+        python -m benchmarks.bench_clean --rows 45000 10000000
+
+    Para cada tamanho um csv sintético é gerado, os dois limpadores são
+    executados e a saída é conferida antes de reportar os tempos.
+"""
+# libraries
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import write_orders_csv
+from currycompany.data import clean_code, read_raw
+
+
+def legacy_clean_code(df):
+    """ Limpeza original das páginas, mantida como referência de saída. """
+    df['ID'] = df['ID'].str.strip()
+    df['Delivery_person_ID'] = df['Delivery_person_ID'].str.strip()
+
+    linhas_vazias = df['Delivery_person_Age'] != 'NaN '
+    df = df.loc[linhas_vazias, :]
+
+    linhas_vazias = df['Road_traffic_density'] != 'NaN '
+    df = df.loc[linhas_vazias, :]
+
+    linhas_vazias = df['City'] != 'NaN '
+    df = df.loc[linhas_vazias, :]
+
+    linhas_vazias = df['Festival'] != 'NaN '
+    df = df.loc[linhas_vazias, :]
+
+    df['Delivery_person_Age'] = df['Delivery_person_Age'].astype( int )
+    df['Delivery_person_Ratings'] = df['Delivery_person_Ratings'].astype( float )
+    df['Order_Date'] = pd.to_datetime( df['Order_Date'], format='%d-%m-%Y' )
+
+    linhas_vazias = df['multiple_deliveries'] != 'NaN '
+    df = df.loc[linhas_vazias, :]
+    df['multiple_deliveries'] = df['multiple_deliveries'].astype( int )
+
+    df = df.reset_index( drop=True )
+
+    df['Time_taken(min)'] = df['Time_taken(min)'].str.extract(r'(\d+)').fillna('0').astype(int)
+    df['Festival'] = df['Festival'].str.strip()
+
+    return df
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'train.csv')
+        write_orders_csv(path, rows)
+
+        legacy, legacy_time = _timed(lambda: legacy_clean_code(pd.read_csv(path)))
+        current, current_time = _timed(lambda: clean_code(read_raw(path)))
+
+    pd.testing.assert_frame_equal(current, legacy)
+
+    return {'rows': rows, 'legacy_s': legacy_time, 'vectorized_s': current_time,
+            'speedup': legacy_time / current_time}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_clean')
+    parser.add_argument('--rows', type=int, nargs='+', default=[45_000, 10_000_000])
+    args = parser.parse_args(argv)
+
+    print('{:>12} {:>12} {:>14} {:>9}'.format('linhas', 'anterior (s)', 'vetorizado (s)', 'ganho'))
+    for rows in args.rows:
+        result = run(rows)
+        print('{rows:>12} {legacy_s:>12.3f} {vectorized_s:>14.3f} {speedup:>8.2f}x'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
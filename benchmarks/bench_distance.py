@@ -0,0 +1,61 @@
+""" Compara a distância vetorizada com o haversine aplicado linha a linha.
+
+    Uso:
+        python -m benchmarks.bench_distance
+        python -m benchmarks.bench_distance --rows 45000 1000000
+
+    Antes de reportar os tempos, confere que o resultado bate com o pacote
+    haversine dentro da tolerância de ponto flutuante.
+"""
+# libraries
+import argparse
+import time
+
+import numpy as np
+from haversine import haversine
+
+from benchmarks.synthetic import generate_orders
+from currycompany.data import CSV_DTYPES
+from currycompany.geo import delivery_distance
+
+COORDINATES = ['Restaurant_latitude', 'Restaurant_longitude',
+               'Delivery_location_latitude', 'Delivery_location_longitude']
+
+
+def rowwise_distance(df):
+    """ Cálculo anterior da página de restaurantes (apply por linha). """
+    return df[COORDINATES].apply(lambda x: haversine((x['Restaurant_latitude'], x['Restaurant_longitude']),
+                                                     (x['Delivery_location_latitude'], x['Delivery_location_longitude'])), axis=1)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run(rows):
+    df = generate_orders(rows).loc[:, COORDINATES].astype({col: CSV_DTYPES[col] for col in COORDINATES})
+
+    rowwise, rowwise_time = _timed(lambda: rowwise_distance(df))
+    vectorized, vectorized_time = _timed(lambda: delivery_distance(df))
+
+    np.testing.assert_allclose(vectorized, rowwise.to_numpy(), rtol=1e-12, atol=1e-9)
+
+    return {'rows': rows, 'rowwise_s': rowwise_time, 'vectorized_s': vectorized_time,
+            'speedup': rowwise_time / vectorized_time}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_distance')
+    parser.add_argument('--rows', type=int, nargs='+', default=[45_000, 1_000_000])
+    args = parser.parse_args(argv)
+
+    print('{:>12} {:>13} {:>14} {:>10}'.format('linhas', 'por linha (s)', 'vetorizado (s)', 'ganho'))
+    for rows in args.rows:
+        result = run(rows)
+        print('{rows:>12} {rowwise_s:>13.3f} {vectorized_s:>14.4f} {speedup:>9.0f}x'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+""" Orçamento de tempo de importação de cada página.
+
+    Uso:
+        python -m benchmarks.importtime
+        python -m benchmarks.importtime --repeat 5 --top 10
+
+    Para cada página os imports do topo do script são executados em um
+    processo novo com python -X importtime, depois dos módulos que o
+    servidor já carregou antes de rodar qualquer página (--preloaded,
+    streamlit por padrão). O custo da página é a soma do tempo acumulado dos
+    módulos importados diretamente por ela, o que um worker novo paga na
+    primeira execução da página. O menor valor de --repeat processos é
+    comparado ao orçamento em benchmarks/import_budget.json; páginas acima
+    do orçamento fazem o comando terminar com código 1.
+
+    Bibliotecas carregadas com currycompany.lazy não entram na conta: elas
+    são importadas quando a visão que as usa é desenhada.
+"""
+# libraries
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['Home.py'] + sorted(os.path.join('pages', name)
+                             for name in os.listdir(os.path.join(REPO_ROOT, 'pages'))
+                             if name.endswith('.py'))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budget.json')
+
+
+def page_imports(page):
+    """ Código dos imports do topo de um script de página.
+
+        Imput: caminho da página relativo à raiz do repositório
+        Output: texto com os comandos import, um por linha
+    """
+    with open(os.path.join(REPO_ROOT, page)) as f:
+        source = f.read()
+
+    nodes = [node for node in ast.parse(source).body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+    return '\n'.join(ast.get_source_segment(source, node) for node in nodes)
+
+
+def parse_importtime(stderr, after):
+    """ Tempo acumulado (µs) dos módulos importados diretamente pelo código.
+
+        Só contam as linhas de nível zero que aparecem depois da importação
+        do módulo after (os módulos pré-carregados).
+
+        Imput: saída de erro do python -X importtime, nome do último módulo
+               pré-carregado (ou None)
+        Output: lista de (módulo, µs acumulados)
+    """
+    entries = []
+    started = after is None
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith(' ' * 2):
+            continue
+        name = name.strip()
+        if started:
+            entries.append((name, int(cumulative)))
+        elif name == after:
+            started = True
+
+    return entries
+
+
+def measure_page(page, preloaded, repeat=3):
+    """ Menor custo de importação da página em repeat processos novos.
+
+        Imput: caminho da página, módulos pré-carregados, repetições
+        Output: (ms, lista de (módulo, ms) da execução mais rápida)
+    """
+    code = ''.join('import {}\n'.format(name) for name in preloaded) + page_imports(page)
+
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                              cwd=REPO_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError('falha ao importar {}:\n{}'.format(page, proc.stderr[-2000:]))
+
+        entries = parse_importtime(proc.stderr, preloaded[-1] if preloaded else None)
+        total = sum(us for _, us in entries)
+        if best is None or total < best[0]:
+            best = (total, entries)
+
+    total, entries = best
+
+    return total / 1000, [(name, us / 1000) for name, us in entries]
+
+
+def load_budget(path=BUDGET_PATH):
+    """ Orçamento em ms por página (páginas sem orçamento não são checadas). """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.importtime')
+    parser.add_argument('pages', nargs='*', default=PAGES, help='páginas (padrão: todas)')
+    parser.add_argument('--preloaded', nargs='*', default=['streamlit'],
+                        help='módulos já carregados pelo servidor antes das páginas')
+    parser.add_argument('--repeat', type=int, default=3, help='processos por página (vale o menor)')
+    parser.add_argument('--top', type=int, default=5, help='módulos mais pesados listados por página')
+    parser.add_argument('--budget', default=BUDGET_PATH, help='json com o orçamento em ms por página')
+    args = parser.parse_args(argv)
+
+    budget = load_budget(args.budget)
+    over = []
+    for page in args.pages:
+        total, entries = measure_page(page, args.preloaded, args.repeat)
+        limit = budget.get(page)
+
+        status = '' if limit is None else ('ok' if total <= limit else 'ACIMA')
+        print('{:<34} {:>8.1f} ms  orçamento {:>6}  {}'.format(
+            page, total, '-' if limit is None else '{:.0f} ms'.format(limit), status))
+        for name, ms in sorted(entries, key=lambda entry: -entry[1])[:args.top]:
+            print('    {:<30} {:>8.1f} ms'.format(name, ms))
+
+        if limit is not None and total > limit:
+            over.append(page)
+
+    if over:
+        print('acima do orçamento: ' + ', '.join(over))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
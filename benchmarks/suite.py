@@ -0,0 +1,330 @@
+""" Suíte de benchmarks sem Streamlit: tempo e memória de cada etapa.
+
+    Uso:
+        python -m benchmarks.suite
+        python -m benchmarks.suite --rows 45000 1000000 10000000 --output bench.json
+        python -m benchmarks.suite --rows 45000 --compare bench.json
+
+    Para cada tamanho um csv sintético (ver benchmarks.synthetic) é gerado
+    em --workdir (e reaproveitado se já existir) e as etapas são medidas em
+    um processo separado, para que o cache de um tamanho não influencie o
+    próximo e o pico de memória do processo seja o daquele tamanho.
+
+    Etapas medidas:
+        - leitura do csv, clean_code, distância e prepare_dataset
+        - gravação e leitura do snapshot
+        - cubo, rollup por entregador, índice de datas e índice de filtros
+        - leitura do csv em blocos (modo 'stream')
+        - construção do arquivo SQLite e todos os relatórios em cada backend
+          de consulta (ver currycompany.query)
+        - cada página inteira, cada visão e cada gráfico (@cached_view) e os
+          mapas, com o cache de figuras vazio
+
+    Cada etapa registra o tempo (melhor de --repeat execuções) e o pico de
+    memória alocada medido com tracemalloc em uma execução à parte, para que
+    o tracemalloc não entre no tempo. O tracemalloc vê as alocações do
+    Python e do NumPy, não as do Arrow; o max_rss de cada processo
+    complementa a medida. O resultado é um json com o ambiente e
+    uma lista de medições; --compare aponta as etapas que ficaram mais
+    lentas que em um json anterior e termina com código 1.
+"""
+# libraries
+import argparse
+import datetime
+import gc
+import inspect
+import json
+import logging
+import os
+import platform
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+# resource só existe em sistemas Unix; no Windows o max_rss não é medido
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES_DIR = os.path.join(REPO_ROOT, 'pages')
+
+DEFAULT_ROWS = [45_000, 1_000_000, 10_000_000]
+
+# Estado dos filtros usado nos gráficos: o padrão da barra lateral
+DATE_LIMIT = datetime.datetime(2022, 4, 13)
+FILTERS = {'Road_traffic_density': ['Low', 'Medium', 'High', 'Jam']}
+
+
+def measure(stage, func, repeat=1, memory=True):
+    """ Mede uma etapa: tempo (melhor de repeat) e pico de memória.
+
+        Imput: nome da etapa, função sem argumentos, repetições, se o pico
+               de memória deve ser medido
+        Output: dicionário com stage, wall_s e peak_mb (None sem memória)
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+
+    return {'stage': stage, 'wall_s': min(times), 'peak_mb': peak_mb}
+
+
+def _quiet_streamlit():
+    """ Silencia os avisos do Streamlit executado fora do servidor. """
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.CRITICAL)
+
+
+def _page_stages(page, figure_cache):
+    """ Funções a medir de uma página: a página, as visões e os gráficos.
+
+        A página é executada uma vez para definir as funções (e aquecer o
+        dataset e as estruturas derivadas). Visões são as funções visao_*;
+        gráficos são as funções com @cached_view, chamadas sem o cache. Os
+        relatórios também ficam no cache de figuras (ver reports.get_report),
+        então ele é esvaziado antes de cada etapa.
+    """
+    path = os.path.join(PAGES_DIR, page)
+    name = os.path.splitext(page)[0]
+    namespace = runpy.run_path(path, run_name='__main__')
+
+    def cold(func):
+        def run():
+            figure_cache.clear()
+            return func()
+        return run
+
+    stages = [('page:' + name, cold(lambda: runpy.run_path(path, run_name='__main__')))]
+
+    for attr, value in namespace.items():
+        if not inspect.isfunction(value):
+            continue
+        func = inspect.unwrap(value)
+        if func.__code__.co_filename != path:
+            continue
+
+        if attr.startswith('visao_'):
+            stages.append(('view:{}.{}'.format(name, attr),
+                           cold(lambda f=value: f(DATE_LIMIT, FILTERS))))
+        elif func is not value and len(inspect.signature(func).parameters) == 2:
+            stages.append(('chart:{}.{}'.format(name, attr),
+                           cold(lambda f=func: f(DATE_LIMIT, FILTERS))))
+
+    return stages
+
+
+def run_single(rows, repeat=1, memory=True):
+    """ Mede todas as etapas para o csv em dataset/train.csv do diretório atual.
+
+        Imput: número de linhas do csv, repetições, se mede memória
+        Output: lista de medições (ver measure)
+    """
+    _quiet_streamlit()
+    sys.path.insert(0, REPO_ROOT)
+
+    from currycompany import config, snapshot
+    from currycompany.cache import figure_cache
+    from currycompany.config import CHUNKSIZE
+    from currycompany.cube import build_cube
+    from currycompany.data import (DATASET_PATH, clean_code, prepare_dataset, read_raw,
+                                   source_signature)
+    from currycompany.dateindex import build_date_index
+    from currycompany.filters import FilterIndex
+    from currycompany.geo import delivery_distance
+    from currycompany.maps import MAP_MODES, map_html
+    from currycompany.reports import REPORTS
+    from currycompany.riders import build_rider_rollup
+    from currycompany.spatial import build_grid
+    from currycompany.sqlbackend import build_database
+    from currycompany.streaming import ingest_stream
+
+    raw = read_raw(DATASET_PATH)
+    cleaned = clean_code(raw)
+    prepared = prepare_dataset(raw)
+    signature = source_signature(DATASET_PATH)
+    del cleaned
+
+    stages = [
+        ('read_csv', lambda: read_raw(DATASET_PATH)),
+        ('clean_code', lambda: clean_code(raw)),
+        ('distance', lambda: delivery_distance(prepared)),
+        ('prepare_dataset', lambda: prepare_dataset(raw)),
+        ('snapshot_write', lambda: snapshot.write_snapshot(prepared, DATASET_PATH, signature)),
+        ('snapshot_read', lambda: snapshot.read_snapshot(DATASET_PATH)),
+        ('build_cube', lambda: build_cube(prepared)),
+        ('build_rider_rollup', lambda: build_rider_rollup(prepared)),
+        ('build_grid', lambda: build_grid(prepared)),
+        ('build_date_index', lambda: build_date_index(prepared)),
+        ('filter_index', lambda: FilterIndex(prepared)),
+        ('stream_ingest', lambda: ingest_stream(DATASET_PATH, CHUNKSIZE)),
+        ('sqlite_build', lambda: build_database(DATASET_PATH, CHUNKSIZE)),
+    ]
+
+    results = []
+    for stage, func in stages:
+        results.append(measure(stage, func, repeat, memory))
+    del raw, prepared
+
+    for page in sorted(p for p in os.listdir(PAGES_DIR) if p.endswith('.py')):
+        for stage, func in _page_stages(page, figure_cache):
+            results.append(measure(stage, func, repeat, memory))
+
+    for label, mode in MAP_MODES.items():
+        def render(mode=mode):
+            figure_cache.clear()
+            return map_html(DATE_LIMIT, FILTERS, mode)
+        results.append(measure('map:' + mode, render, repeat, memory))
+
+    for backend in ('pandas', 'sqlite'):
+        def reports(backend=backend):
+            figure_cache.clear()
+            config.QUERY_BACKEND = backend
+            try:
+                return [func(DATE_LIMIT, FILTERS) for func in REPORTS.values()]
+            finally:
+                config.QUERY_BACKEND = 'pandas'
+        results.append(measure('reports:' + backend, reports, repeat, memory))
+
+    for result in results:
+        result['rows'] = rows
+
+    return results
+
+
+def environment():
+    """ Versões e máquina em que a suíte rodou. """
+    import numpy as np
+    import pandas as pd
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ingest_mode': os.environ.get('CURRYCOMPANY_INGEST', 'memory'),
+    }
+
+
+def _dataset_dir(workdir, rows, seed):
+    """ Diretório com dataset/train.csv de rows linhas (gerado uma vez). """
+    from benchmarks.synthetic import write_orders_csv
+
+    base = os.path.join(workdir, 'rows-{}-seed-{}'.format(rows, seed))
+    csv = os.path.join(base, 'dataset', 'train.csv')
+    if not os.path.exists(csv):
+        os.makedirs(os.path.dirname(csv), exist_ok=True)
+        write_orders_csv(csv + '.tmp', rows, seed=seed)
+        os.replace(csv + '.tmp', csv)
+
+    return base
+
+
+def _run_subprocess(base, rows, args):
+    """ Executa run_single em um processo novo, dentro de base. """
+    command = [sys.executable, '-m', 'benchmarks.suite', '--single', str(rows),
+               '--repeat', str(args.repeat)]
+    if args.no_memory:
+        command.append('--no-memory')
+
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    output = subprocess.run(command, cwd=base, env=env, check=True,
+                            stdout=subprocess.PIPE).stdout
+
+    # a última linha é o json (o Streamlit pode escrever antes dela)
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """ Etapas mais lentas que no json anterior além da tolerância.
+
+        Imput: medições atuais, json anterior, tolerância (0.2 = 20%)
+        Output: lista de (etapa, linhas, tempo anterior, tempo atual)
+    """
+    previous = {(r['stage'], r['rows']): r['wall_s'] for r in baseline['results']}
+
+    slower = []
+    for r in results:
+        before = previous.get((r['stage'], r['rows']))
+        if before is not None and r['wall_s'] > before * (1 + tolerance):
+            slower.append((r['stage'], r['rows'], before, r['wall_s']))
+
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='execuções cronometradas por etapa')
+    parser.add_argument('--no-memory', action='store_true', help='não mede o pico de memória')
+    parser.add_argument('--workdir', help='onde guardar os csv gerados (padrão: temporário)')
+    parser.add_argument('--output', default='benchmark.json', help='json com os resultados')
+    parser.add_argument('--compare', help='json anterior para apontar regressões')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # processo filho: mede o csv do diretório atual e devolve json no stdout
+    if args.single is not None:
+        results = run_single(args.single, args.repeat, not args.no_memory)
+        max_rss_mb = None
+        if resource is not None:
+            max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        results.append({'stage': 'process', 'rows': args.single, 'wall_s': None,
+                        'peak_mb': None, 'max_rss_mb': max_rss_mb})
+        print()
+        print(json.dumps(results))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+
+        results = []
+        for rows in args.rows:
+            base = _dataset_dir(workdir, rows, args.seed)
+            results += _run_subprocess(base, rows, args)
+
+    print('{:>10} {:<45} {:>10} {:>10}'.format('linhas', 'etapa', 'tempo (s)', 'pico (MB)'))
+    for r in results:
+        if r['stage'] == 'process':
+            rss = '' if r['max_rss_mb'] is None else '{:.1f}'.format(r['max_rss_mb'])
+            print('{:>10} {:<45} {:>10} {:>10}'.format(r['rows'], 'max_rss do processo', '', rss))
+            continue
+        peak = '' if r['peak_mb'] is None else '{:.1f}'.format(r['peak_mb'])
+        print('{:>10} {:<45} {:>10.3f} {:>10}'.format(r['rows'], r['stage'], r['wall_s'], peak))
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare([r for r in results if r['wall_s'] is not None], json.load(f), args.tolerance)
+        for stage, rows, before, after in slower:
+            print('mais lento: {} ({} linhas) {:.3f}s -> {:.3f}s'.format(stage, rows, before, after))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
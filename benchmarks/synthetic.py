@@ -0,0 +1,127 @@
+""" Gerador de pedidos sintéticos no formato do dataset/train.csv.
+
+    Reproduz as manias do csv original: espaços no fim dos textos, o texto
+    'NaN ' nas colunas vazias, 'conditions NaN' no clima, coordenadas de
+    restaurante zeradas ou negativas e o tempo no formato '(min) 24'.
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+           'Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude',
+           'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+           'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order',
+           'Type_of_vehicle', 'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)']
+
+CITY_PREFIXES = ['INDO', 'BANG', 'COIMB', 'CHEN', 'HYD', 'RANCHI', 'MYS', 'DEH', 'KOC',
+                 'PUNE', 'LUDH', 'KNP', 'MUM', 'KOL', 'JAP', 'SUR', 'GOA', 'AURG',
+                 'AGR', 'VAD', 'ALH', 'BHP']
+CITIES = ['Metropolitian ', 'Urban ', 'Semi-Urban ']
+TRAFFIC = ['Low ', 'Medium ', 'High ', 'Jam ']
+WEATHER = ['conditions Sunny', 'conditions Stormy', 'conditions Sandstorms',
+           'conditions Cloudy', 'conditions Fog', 'conditions Windy']
+ORDER_TYPES = ['Snack ', 'Meal ', 'Drinks ', 'Buffet ']
+VEHICLES = ['motorcycle ', 'scooter ', 'electric_scooter ', 'bicycle ']
+
+FIRST_DATE = '2022-02-11'
+DAYS = 54
+
+# Proporção aproximada de linhas com dados ausentes no dataset original
+MISSING_RATE = 0.04
+
+
+def _with_missing(rng, values, rate, missing='NaN '):
+    values = values.astype(object)
+    values[rng.random(len(values)) < rate] = missing
+    return values
+
+
+def generate_orders(n_rows, seed=0, start_id=0):
+    """ Gera um dataframe bruto (apenas textos e números) como o train.csv.
+
+        Imput: número de linhas, semente, primeiro ID
+        Output: dataframe com as colunas do csv original
+    """
+    rng = np.random.default_rng(seed)
+
+    riders = np.array(['{}RES{:02d}DEL{:02d} '.format(p, r, d)
+                       for p in CITY_PREFIXES for r in range(1, 21) for d in range(1, 4)])
+    rider = rng.integers(0, len(riders), n_rows)
+
+    # Cada entregador tem uma idade e um restaurante base fixos
+    rider_age = np.random.default_rng(seed + 1).integers(15, 51, len(riders))
+    rider_lat = np.random.default_rng(seed + 2).uniform(9.0, 31.0, len(riders)).round(6)
+    rider_lon = np.random.default_rng(seed + 3).uniform(72.0, 89.0, len(riders)).round(6)
+
+    restaurant_lat = rider_lat[rider]
+    restaurant_lon = rider_lon[rider]
+    bad = rng.random(n_rows)
+    restaurant_lat = np.where(bad < 0.04, -restaurant_lat, restaurant_lat)
+    restaurant_lat = np.where(bad > 0.99, 0.0, restaurant_lat)
+    restaurant_lon = np.where(bad > 0.99, 0.0, restaurant_lon)
+
+    delivery_lat = (np.abs(restaurant_lat) + rng.uniform(0.01, 0.13, n_rows)).round(6)
+    delivery_lon = (np.abs(restaurant_lon) + rng.uniform(0.01, 0.13, n_rows)).round(6)
+    delivery_lat = np.where(bad > 0.99, 0.11, delivery_lat)
+    delivery_lon = np.where(bad > 0.99, 0.11, delivery_lon)
+
+    # As linhas vazias do csv original têm idade e avaliação ausentes juntas
+    missing = rng.random(n_rows) < MISSING_RATE
+    age = rider_age[rider].astype(str).astype(object)
+    age[missing] = 'NaN '
+    ratings = rng.choice(np.arange(25, 51) / 10, n_rows).astype(str).astype(object)
+    ratings[missing] = 'NaN '
+
+    dates = pd.date_range(FIRST_DATE, periods=DAYS).strftime('%d-%m-%Y').to_numpy()
+    minutes = rng.integers(0, 24 * 60, n_rows)
+    ordered = np.char.add(np.char.add(np.char.zfill((minutes // 60).astype(str), 2), ':'),
+                          np.char.zfill((minutes % 60).astype(str), 2))
+    picked = (minutes + 5 + 5 * rng.integers(0, 3, n_rows)) % (24 * 60)
+    picked = np.char.add(np.char.add(np.char.zfill((picked // 60).astype(str), 2), ':'),
+                         np.char.zfill((picked % 60).astype(str), 2))
+    ordered = np.char.add(ordered, ':00').astype(object)
+    ordered[missing] = 'NaN '
+
+    df = pd.DataFrame({
+        'ID': ['0x{:x} '.format(i) for i in range(start_id, start_id + n_rows)],
+        'Delivery_person_ID': riders[rider],
+        'Delivery_person_Age': age,
+        'Delivery_person_Ratings': ratings,
+        'Restaurant_latitude': restaurant_lat,
+        'Restaurant_longitude': restaurant_lon,
+        'Delivery_location_latitude': delivery_lat,
+        'Delivery_location_longitude': delivery_lon,
+        'Order_Date': rng.choice(dates, n_rows),
+        'Time_Orderd': ordered,
+        'Time_Order_picked': np.char.add(picked, ':00'),
+        'Weatherconditions': _with_missing(rng, rng.choice(WEATHER, n_rows), 0.015, 'conditions NaN'),
+        'Road_traffic_density': _with_missing(rng, rng.choice(TRAFFIC, n_rows, p=[.34, .24, .10, .32]), 0.015),
+        'Vehicle_condition': rng.integers(0, 4, n_rows),
+        'Type_of_order': rng.choice(ORDER_TYPES, n_rows),
+        'Type_of_vehicle': rng.choice(VEHICLES, n_rows, p=[.58, .33, .08, .01]),
+        'multiple_deliveries': _with_missing(rng, rng.choice(['0', '1', '2', '3'], n_rows, p=[.31, .62, .05, .02]), 0.02),
+        'Festival': _with_missing(rng, rng.choice(['No ', 'Yes '], n_rows, p=[.98, .02]), 0.005),
+        'City': _with_missing(rng, rng.choice(CITIES, n_rows, p=[.75, .22, .03]), 0.026),
+        'Time_taken(min)': np.char.add('(min) ', rng.integers(10, 55, n_rows).astype(str)),
+    })
+
+    return df[COLUMNS]
+
+
+def write_orders_csv(path, n_rows, seed=0, chunk_rows=1_000_000):
+    """ Grava um csv sintético com n_rows pedidos, em blocos.
+
+        Gerar em blocos mantém a memória limitada mesmo para 10M de linhas.
+
+        Imput: caminho de saída, número de linhas, semente, linhas por bloco
+        Output: caminho de saída
+    """
+    written = 0
+    while written < n_rows:
+        rows = min(chunk_rows, n_rows - written)
+        chunk = generate_orders(rows, seed=seed + written, start_id=written)
+        chunk.to_csv(path, index=False, header=(written == 0), mode='w' if written == 0 else 'a')
+        written += rows
+
+    return path
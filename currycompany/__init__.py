@@ -0,0 +1,5 @@
+""" Biblioteca de dados do dashboard da Curry Company.
+
+    Aqui ficam a leitura e a limpeza do dataset compartilhadas pelas
+    páginas do Streamlit.
+"""
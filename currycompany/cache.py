@@ -0,0 +1,166 @@
+""" Cache LRU de figuras e agregados, compartilhado entre as sessões.
+
+    A chave de cada entrada é a função, o estado normalizado dos filtros
+    (ver selection.state_key, que já inclui a versão do dataset) e os demais
+    argumentos. O cache é limitado pelo tamanho estimado das entradas: ao
+    passar do limite, as menos usadas recentemente são descartadas.
+
+    O limite é configurado por CURRYCOMPANY_FIGURE_CACHE_MB (ver config).
+"""
+# libraries
+import collections
+import functools
+import sys
+import threading
+
+import pandas as pd
+
+from currycompany import config
+from currycompany.instrument import stage
+from currycompany.selection import state_key
+
+
+def estimate_size(value):
+    """ Tamanho aproximado (bytes) de um valor guardado no cache. """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(item) for item in value)
+    if hasattr(value, 'to_json'):
+        # Figuras do plotly: o tamanho do JSON é o que vai para o navegador
+        return len(value.to_json())
+
+    return sys.getsizeof(value)
+
+
+_MISSING = object()
+
+
+class _Pending:
+    """ Cálculo de uma chave em andamento. """
+
+    __slots__ = ('done', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _MISSING
+
+
+class FigureCache:
+    """ Cache LRU limitado por memória, seguro para várias threads.
+
+        O cálculo de uma entrada ausente é feito fora do lock, então ninguém
+        espera pelo cálculo de chaves diferentes. Quem pede uma chave que
+        já está sendo calculada (por outra sessão ou pelo aquecimento, ver
+        warmup) espera esse cálculo em vez de repeti-lo.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending()
+                self.misses += 1
+                owner = True
+            else:
+                self.waits += 1
+                owner = False
+
+        if not owner:
+            pending.done.wait()
+            if pending.value is not _MISSING:
+                return pending.value
+            # o cálculo falhou na outra thread: tenta de novo aqui
+            return self.get_or_compute(key, compute)
+
+        try:
+            value = compute()
+            self.put(key, value)
+            pending.value = value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+        return value
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """ Contadores do cache: acertos, faltas, esperas, descartes e ocupação. """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'waits': self.waits,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_bytes': self.max_bytes}
+
+
+figure_cache = FigureCache(int(config.FIGURE_CACHE_MB * 2**20))
+
+
+def cached_view(func):
+    """ Decorator: guarda o resultado de func(date_limit, filtros, *args).
+
+        As páginas do Streamlit rodam como __main__, então o arquivo da
+        função também entra na chave para separar funções de páginas
+        diferentes.
+    """
+    name = (func.__code__.co_filename, func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(date_limit, filtros, *args):
+        key = (name, state_key(date_limit, filtros), args)
+
+        with stage('chart:' + func.__qualname__) as record:
+            if record is None:
+                return figure_cache.get_or_compute(key, lambda: func(date_limit, filtros, *args))
+
+            # com a instrumentação ligada, registra se a figura veio do cache
+            record.cached = True
+
+            def compute():
+                record.cached = False
+                return func(date_limit, filtros, *args)
+
+            return figure_cache.get_or_compute(key, compute)
+
+    return wrapper
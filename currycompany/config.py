@@ -0,0 +1,51 @@
+""" Configuração do dashboard lida de variáveis de ambiente.
+
+    CURRYCOMPANY_INGEST     'memory' (padrão): o dataset limpo inteiro fica
+                            em memória e os agregados são construídos a
+                            partir dele.
+                            'stream': o csv é lido em blocos e apenas os
+                            agregados ficam em memória (ver streaming).
+    CURRYCOMPANY_BACKEND    'pandas' (padrão): os relatórios saem do cubo e do
+                            rollup por entregador em memória.
+                            'sqlite': os relatórios e os mapas são consultas
+                            sobre um arquivo SQLite construído a partir do
+                            csv limpo (ver query e sqlbackend), sem o
+                            dataframe de pedidos em memória.
+    CURRYCOMPANY_CHUNKSIZE  linhas por bloco no modo 'stream'.
+    CURRYCOMPANY_WATCH      intervalo (s) do observador que incorpora as
+                            linhas novas do csv em segundo plano; 0 (padrão)
+                            desliga o observador (ver watch).
+    CURRYCOMPANY_WARMUP     1 (padrão) carrega os dados e calcula os
+                            relatórios da visão padrão em segundo plano assim
+                            que o processo começa (ver warmup); 0 desliga.
+    CURRYCOMPANY_FIGURE_CACHE_MB
+                            limite de memória do cache de figuras e
+                            agregados compartilhado entre sessões (ver cache).
+    CURRYCOMPANY_WORKERS    threads que calculam ao mesmo tempo os relatórios
+                            de uma visão (ver parallel); 1 calcula um por
+                            vez. Padrão: núcleos da máquina, até 8.
+    CURRYCOMPANY_MAX_CHART_POINTS
+                            máximo de pontos dos gráficos de datas; o
+                            período (dia, semana, mês, ...) é escolhido para
+                            caber nele (ver timeseries). Padrão 120.
+    CURRYCOMPANY_GRID_DEGREES
+                            lado (em graus) das células da grade espacial
+                            das entregas e restaurantes (ver spatial).
+                            Padrão 0.05 (cerca de 5 km).
+    CURRYCOMPANY_PROFILE    1 liga a instrumentação das etapas e o painel de
+                            debug da barra lateral (ver instrument); 0
+                            (padrão) desliga.
+"""
+# libraries
+import os
+
+INGEST_MODE = os.environ.get('CURRYCOMPANY_INGEST', 'memory')
+QUERY_BACKEND = os.environ.get('CURRYCOMPANY_BACKEND', 'pandas')
+CHUNKSIZE = int(os.environ.get('CURRYCOMPANY_CHUNKSIZE', 250_000))
+WATCH_INTERVAL = float(os.environ.get('CURRYCOMPANY_WATCH', 0))
+WARMUP = os.environ.get('CURRYCOMPANY_WARMUP', '1') not in ('', '0')
+FIGURE_CACHE_MB = float(os.environ.get('CURRYCOMPANY_FIGURE_CACHE_MB', 64))
+WORKERS = int(os.environ.get('CURRYCOMPANY_WORKERS', min(8, os.cpu_count() or 1)))
+MAX_CHART_POINTS = int(os.environ.get('CURRYCOMPANY_MAX_CHART_POINTS', 120))
+GRID_DEGREES = float(os.environ.get('CURRYCOMPANY_GRID_DEGREES', 0.05))
+PROFILE = os.environ.get('CURRYCOMPANY_PROFILE', '0') not in ('', '0')
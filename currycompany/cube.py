@@ -0,0 +1,156 @@
+""" Cubo de métricas pré-agregado por dia.
+
+    Cada célula do cubo é uma combinação de dia e das dimensões usadas nos
+    gráficos (cidade, trânsito, festival, tipo de pedido e clima) e guarda
+    as estatísticas suficientes das métricas: quantidade de valores, soma e
+    soma dos quadrados. Contagens, médias e desvios padrão de qualquer
+    agrupamento dessas dimensões saem da soma das células, sem voltar às
+    linhas dos pedidos.
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+from currycompany.data import DATASET_PATH, load_derived
+from currycompany.schema import concat_frames
+
+CUBE_DIMENSIONS = ['Order_Date', 'City', 'Road_traffic_density', 'Festival',
+                   'Type_of_order', 'Weatherconditions']
+
+# nome curto da métrica -> coluna do dataset
+CUBE_METRICS = {
+    'time': 'Time_taken(min)',
+    'ratings': 'Delivery_person_Ratings',
+    'distance': 'distance',
+}
+
+STATISTICS = ['n', 'sum', 'sumsq']
+
+CUBE_VALUES = ['orders'] + ['{}_{}'.format(m, s) for m in CUBE_METRICS for s in STATISTICS]
+
+
+def build_cube(df):
+    """ Agrega o dataframe limpo nas células do cubo.
+
+        Imput: dataframe limpo (com a coluna distance)
+        Output: dataframe com as dimensões e as estatísticas de cada célula
+    """
+    values = {dim: df[dim] for dim in CUBE_DIMENSIONS}
+    values['orders'] = np.ones(len(df), dtype='int64')
+
+    for metric, col in CUBE_METRICS.items():
+        x = df[col].to_numpy(dtype='float64')
+        valid = ~np.isnan(x)
+        x = np.where(valid, x, 0.0)
+        values[metric + '_n'] = valid.astype('int64')
+        values[metric + '_sum'] = x
+        values[metric + '_sumsq'] = x * x
+
+    # As dimensões são categóricas: observed=True evita o produto cartesiano
+    # das categorias, e o sort_index garante a ordem (com observed=True o
+    # pandas devolve os grupos na ordem em que aparecem)
+    cube = (pd.DataFrame(values)
+              .groupby(CUBE_DIMENSIONS, sort=True, dropna=False, observed=True)
+              .sum()
+              .sort_index()
+              .reset_index())
+
+    return cube
+
+
+def merge_cubes(cubes):
+    """ Junta cubos de partes diferentes do dataset somando as células.
+
+        Imput: lista de cubos (ver build_cube)
+        Output: cubo equivalente ao do dataset inteiro
+    """
+    return (concat_frames(cubes)
+              .groupby(CUBE_DIMENSIONS, sort=True, dropna=False, observed=True)[CUBE_VALUES]
+              .sum()
+              .sort_index()
+              .reset_index())
+
+
+def replace_days(old, partial, merge):
+    """ Junta um agregado parcial ao agregado existente, dia a dia.
+
+        Só as linhas dos dias presentes no parcial são refeitas; os demais
+        dias são mantidos como estão. O resultado continua ordenado por
+        Order_Date.
+
+        Imput: agregado existente, agregado das linhas novas, função merge
+        Output: agregado atualizado
+    """
+    affected = old['Order_Date'].isin(partial['Order_Date'].unique())
+    merged = merge([old.loc[affected], partial])
+
+    return (concat_frames([old.loc[~affected], merged])
+              .sort_values('Order_Date', kind='mergesort', ignore_index=True))
+
+
+def kept_rows(frame, new_rows):
+    """ Linhas do início de frame que não mudam de posição com as linhas novas.
+
+        Em um dataframe ordenado por Order_Date (o dataset, ou um agregado
+        depois de replace_days), são as linhas anteriores ao primeiro dia
+        das linhas novas.
+
+        Imput: dataframe ordenado por data (já atualizado), linhas novas
+        Output: quantidade de linhas mantidas
+    """
+    if not len(new_rows):
+        return len(frame)
+
+    return int(frame['Order_Date'].searchsorted(new_rows['Order_Date'].min(), side='left'))
+
+
+def update_cube(cube, new_rows, df):
+    """ Atualiza o cubo com as linhas novas do csv (ver data.load_derived). """
+    return replace_days(cube, build_cube(new_rows), merge_cubes)
+
+
+def load_cube(path=DATASET_PATH):
+    """ Cubo da versão atual do dataset, construído uma vez por processo. """
+    return load_derived('cube', build_cube, path, updater=update_cube)
+
+
+def summarize(sums):
+    """ Converte somas de células em contagem, média e desvio padrão.
+
+        O desvio padrão é amostral (ddof=1), como o std do pandas, e fica
+        NaN quando há menos de dois valores.
+
+        Imput: dataframe com as colunas de CUBE_VALUES já somadas
+        Output: dataframe com orders, <métrica>_mean e <métrica>_std
+    """
+    out = pd.DataFrame({'orders': sums['orders']}, index=sums.index)
+
+    for metric in CUBE_METRICS:
+        n = sums[metric + '_n'].astype('float64')
+        total = sums[metric + '_sum']
+        sumsq = sums[metric + '_sumsq']
+
+        mean = total / n.where(n > 0)
+        var = ((sumsq - total * mean) / (n - 1).where(n > 1)).clip(lower=0)
+
+        out[metric + '_mean'] = mean
+        out[metric + '_std'] = np.sqrt(var)
+
+    return out
+
+
+def rollup(cube, by):
+    """ Junta as células do cubo agrupando pelas dimensões pedidas.
+
+        Equivale a um groupby(by) sobre as linhas originais com count, mean e
+        std, mas o custo depende do número de células e não de pedidos.
+
+        Imput: cubo (já filtrado), lista de dimensões ([] para o total)
+        Output: dataframe indexado pelas dimensões (ver summarize)
+    """
+    if by:
+        sums = cube.groupby(by, sort=True, observed=True)[CUBE_VALUES].sum().sort_index()
+    else:
+        sums = cube[CUBE_VALUES].sum().to_frame().T
+
+    return summarize(sums)
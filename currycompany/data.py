@@ -0,0 +1,462 @@
+# libraries
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from currycompany import snapshot
+from currycompany.geo import clean_coordinates, delivery_distance
+from currycompany.instrument import stage, timed
+from currycompany.schema import compact_schema, concat_frames
+
+DATASET_PATH = 'dataset/train.csv'
+
+# Bytes finais já processados que são guardados para confirmar, antes de
+# uma leitura incremental, que o começo do csv não foi reescrito
+FINGERPRINT_BYTES = 4096
+
+
+# Colunas em que o csv marca dados ausentes com o texto 'NaN '
+NA_COLUMNS = ['Delivery_person_Age', 'Delivery_person_Ratings', 'Road_traffic_density',
+              'City', 'Festival', 'multiple_deliveries']
+
+# Linhas com qualquer uma destas colunas vazia são descartadas na limpeza
+REQUIRED_COLUMNS = ['Delivery_person_Age', 'Road_traffic_density', 'City',
+                    'Festival', 'multiple_deliveries']
+
+# Tipos definidos já na leitura do csv. Idade e multiple_deliveries são lidas
+# como float por causa dos NaN e viram inteiros depois do filtro
+CSV_DTYPES = {
+    'ID': 'object',
+    'Delivery_person_ID': 'object',
+    'Delivery_person_Age': 'float64',
+    'Delivery_person_Ratings': 'float64',
+    'Restaurant_latitude': 'float64',
+    'Restaurant_longitude': 'float64',
+    'Delivery_location_latitude': 'float64',
+    'Delivery_location_longitude': 'float64',
+    'Vehicle_condition': 'int64',
+    'multiple_deliveries': 'float64',
+    'Time_taken(min)': 'object',
+}
+
+READ_CSV_OPTIONS = {
+    'dtype': CSV_DTYPES,
+    'na_values': {col: ['NaN '] for col in NA_COLUMNS},
+}
+
+
+@timed('read_csv')
+def read_raw(path=DATASET_PATH, **kwargs):
+    """ Lê o csv bruto já com os tipos e os valores ausentes definidos.
+
+        Parâmetros extras (ex.: chunksize) são repassados ao pd.read_csv.
+
+        Imput: caminho do csv
+        Output: dataframe bruto pronto para o clean_code
+    """
+    return pd.read_csv(path, **READ_CSV_OPTIONS, **kwargs)
+
+
+@timed('clean_code')
+def clean_code(df):
+    """ Esta função tem a responsabilibsade de limpar o dataframe
+
+        Tipos de limpeza:
+        1. Remoção dos dados NaN
+        2. Mudança do tipo de coluna de dados
+        3. Remoção dos espaços das variáveis de texto
+        4. Formatação da coluna de datas
+        5. Limpeza da coluna de tempo ( remoção do texto da variável numérica)
+
+        Todas as linhas vazias são removidas de uma só vez, com uma única
+        máscara, e as conversões são vetorizadas.
+
+        Imput: dataframe lido com read_raw
+        Output: dataframe
+    """
+    # Uma única máscara com todas as colunas obrigatórias e uma única cópia
+    # das linhas selecionadas
+    linhas_validas = df[REQUIRED_COLUMNS].notna().all(axis=1).to_numpy()
+    if not linhas_validas.all():
+        df = df.take(np.flatnonzero(linhas_validas))
+    else:
+        df = df.copy()
+    df.index = pd.RangeIndex(len(df))
+
+    # Remover spaco da string
+    df['ID'] = df['ID'].str.strip()
+    df['Delivery_person_ID'] = df['Delivery_person_ID'].str.strip()
+    df['Festival'] = df['Festival'].str.strip()
+
+    # Conversao para numeros inteiros (os NaN já foram removidos)
+    df['Delivery_person_Age'] = df['Delivery_person_Age'].astype('int64')
+    df['multiple_deliveries'] = df['multiple_deliveries'].astype('int64')
+
+    # Conversao de texto para data
+    df['Order_Date'] = pd.to_datetime( df['Order_Date'], format='%d-%m-%Y' )
+
+    # Retirando os numeros da coluna Time_taken(min). A coluna tem poucos
+    # valores distintos, então a extração roda só sobre eles
+    codigos, valores = pd.factorize(df['Time_taken(min)'])
+    minutos = (pd.Series(valores).str.extract(r'(\d+)', expand=False)
+                                 .fillna('0')
+                                 .astype('int64')
+                                 .to_numpy())
+    df['Time_taken(min)'] = np.append(minutos, 0)[codigos]
+
+    return df
+
+
+def derive_columns(df):
+    """ Acrescenta as colunas derivadas calculadas uma única vez na carga.
+
+        Antes, as coordenadas com sinal trocado ou zeradas são corrigidas
+        (ver geo.clean_coordinates), para que não entrem nas distâncias.
+
+        - distance: distância (km) entre restaurante e local de entrega
+
+        Imput: dataframe limpo
+        Output: o mesmo dataframe com as colunas derivadas
+    """
+    clean_coordinates(df)
+    df['distance'] = delivery_distance(df)
+
+    return df
+
+
+@timed('prepare_dataset')
+def prepare_dataset(df):
+    """ Limpa o dataframe bruto, calcula as colunas derivadas e ordena.
+
+        As colunas derivadas são calculadas antes da compactação (ver
+        currycompany.schema), com as coordenadas ainda em float64.
+        O resultado fica em ordem de Order_Date (ordenação estável), o que
+        permite filtrar datas por busca binária (ver currycompany.dateindex).
+    """
+    df = compact_schema(derive_columns(clean_code(df)))
+    df = df.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+
+    return df
+
+
+def source_signature(path=DATASET_PATH):
+    """ Retorna a assinatura do arquivo fonte do dataset.
+
+        A assinatura muda sempre que o arquivo é reescrito ou recebe novas
+        linhas, e é ela que decide quando o cache precisa ser refeito.
+
+        Imput: caminho do csv
+        Output: tupla (caminho absoluto, mtime em ns, tamanho em bytes)
+    """
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+@timed('load_dataset')
+def _read_clean(path, signature):
+    """ Lê o dataset limpo, preferindo o snapshot colunar ao csv.
+
+        Se o snapshot estiver desatualizado, o csv é lido e limpo e um novo
+        snapshot é gravado para os próximos processos. Falhas na gravação
+        (ex.: diretório somente leitura) não impedem o carregamento.
+    """
+    if snapshot.snapshot_is_fresh(path, signature):
+        return snapshot.read_snapshot(path)
+
+    df = prepare_dataset(read_raw(path))
+
+    try:
+        snapshot.write_snapshot(df, path, signature)
+    except OSError:
+        pass
+
+    return df
+
+
+def rebuild_snapshot(path=DATASET_PATH):
+    """ Refaz o snapshot a partir do csv, mesmo que ele esteja atualizado.
+
+        Imput: caminho do csv
+        Output: caminho do snapshot gravado
+    """
+    signature = source_signature(path)
+    df = prepare_dataset(read_raw(path))
+
+    return snapshot.write_snapshot(df, path, signature)
+
+
+def tail_fingerprint(path, offset):
+    """ Últimos bytes do csv antes do offset já processado.
+
+        Se esses bytes continuam iguais e terminam em uma quebra de linha, o
+        arquivo só recebeu linhas novas no fim e pode ser lido a partir do
+        offset.
+    """
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        return f.read(min(offset, FINGERPRINT_BYTES))
+
+
+def can_append(path, offset, fingerprint):
+    """ Verifica se o csv apenas cresceu desde o offset processado. """
+    if fingerprint is None or not fingerprint.endswith(b'\n'):
+        return False
+    if os.stat(path).st_size <= offset:
+        return False
+
+    return tail_fingerprint(path, offset) == fingerprint
+
+
+def read_tail(path, offset):
+    """ Lê as linhas completas acrescentadas ao csv depois do offset.
+
+        Uma última linha ainda sem quebra de linha (escrita em andamento)
+        fica para a próxima leitura.
+
+        Imput: caminho do csv, offset em bytes já processado
+        Output: (dataframe bruto das linhas novas ou None, novo offset)
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return None, offset
+
+    columns = pd.read_csv(path, nrows=0).columns
+    raw = read_raw(io.BytesIO(data[:end]), header=None, names=columns)
+
+    return raw, offset + end
+
+
+def freeze(df):
+    """ Marca os arrays de todas as colunas do dataframe como somente leitura.
+
+        O dataset do cache é um só para todas as sessões; com os arrays
+        travados, uma atribuição que alteraria os dados compartilhados (em
+        df ou em uma fatia dele, como df.iloc[:n]) gera erro em vez de
+        mudar o que as outras sessões veem. Colunas novas continuam
+        possíveis em cópias e em resultados de filtros (take, máscaras).
+
+        Imput: dataframe
+        Output: o mesmo dataframe
+    """
+    # _mgr.arrays devolve os arrays internos (blocos) sem cópia
+    for values in df._mgr.arrays:
+        values = getattr(values, '_ndarray', values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+
+    return df
+
+
+def read_position(path, signature):
+    """ Até onde uma leitura completa do csv, começada na assinatura
+        signature, leu o arquivo.
+
+        Se o csv mudou durante a leitura, não se sabe até onde ele foi lido:
+        o fingerprint é None e a próxima mudança fará uma leitura completa.
+
+        Imput: caminho do csv, assinatura do começo da leitura
+        Output: (offset, fingerprint)
+    """
+    fingerprint = None
+    if source_signature(path) == signature:
+        fingerprint = tail_fingerprint(path, signature[2])
+
+    return signature[2], fingerprint
+
+
+class SourceEntry:
+    """ Valor construído a partir de uma versão do csv.
+
+        offset é a quantidade de bytes do csv já incorporada ao valor e
+        fingerprint os últimos bytes antes dele (ver can_append).
+    """
+
+    def __init__(self, signature, value, offset, fingerprint):
+        self.signature = signature
+        self.value = value
+        self.offset = offset
+        self.fingerprint = fingerprint
+
+
+class SourceCache:
+    """ Cache por processo de um valor construído a partir do csv.
+
+        build(caminho, assinatura) constrói o valor lendo o csv inteiro.
+        Quando o csv apenas recebe linhas no fim, só elas são lidas (ver
+        read_tail) e append(caminho, entrada, raw) devolve o valor com as
+        linhas novas incorporadas; a entrada já traz a nova assinatura, o
+        offset e o fingerprint. restore(caminho), se houver, devolve a
+        SourceEntry gravada por outro processo (ex.: a meta do arquivo
+        SQLite, ver sqlbackend) ou None.
+
+        O lock garante que sessões simultâneas esperem uma única leitura em
+        vez de cada uma reprocessar o csv.
+    """
+
+    def __init__(self, build, append, restore=None):
+        self.build = build
+        self.append = append
+        self.restore = restore
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def load(self, path=DATASET_PATH):
+        """ Entrada da versão atual do csv (ver SourceEntry). """
+        signature = source_signature(path)
+
+        with self.lock:
+            entry = self.entries.get(signature[0])
+            if entry is None and self.restore is not None:
+                entry = self.restore(path)
+
+            if entry is not None and entry.signature != signature:
+                if can_append(path, entry.offset, entry.fingerprint):
+                    self.entries[signature[0]] = entry
+                    self._append_tail(path, entry, signature)
+                else:
+                    entry = None
+
+            if entry is None:
+                value = self.build(path, signature)
+                entry = SourceEntry(signature, value, *read_position(path, signature))
+
+            self.entries[signature[0]] = entry
+
+            return entry
+
+    def _append_tail(self, path, entry, signature):
+        raw, offset = read_tail(path, entry.offset)
+        entry.signature = signature
+        if raw is None:
+            return
+
+        # A entrada já fica na nova versão: o append pode carregar o próprio
+        # valor de novo (ver load_derived). Se ele falhar, a próxima leitura
+        # é completa
+        entry.offset, entry.fingerprint = offset, tail_fingerprint(path, offset)
+        try:
+            entry.value = self.append(path, entry, raw)
+        except BaseException:
+            self.entries.pop(signature[0], None)
+            raise
+
+    def refresh(self, path=DATASET_PATH):
+        """ Incorpora as mudanças do csv, se o valor já foi carregado.
+
+            Usado pelo observador de arquivo (ver watch) para que as sessões
+            não esperem pela leitura das linhas novas.
+        """
+        with self.lock:
+            if os.path.abspath(path) in self.entries:
+                self.load(path)
+
+
+class _Dataset:
+    """ Dataset limpo de uma versão do csv e as estruturas derivadas dele. """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.derived = {}
+        self.updaters = {}
+
+
+def _full_dataset(path, signature):
+    return _Dataset(freeze(_read_clean(path, signature)))
+
+
+@timed('append_tail')
+def _append_dataset(path, entry, raw):
+    """ Incorpora ao cache apenas as linhas novas do fim do csv.
+
+        As linhas novas são limpas e juntadas ao dataset (reordenando só se
+        chegarem datas anteriores às já carregadas). Cada estrutura derivada
+        com updater é atualizada com as linhas novas; as demais são
+        descartadas e refeitas no próximo acesso.
+
+        As estruturas são atualizadas na ordem em que foram construídas, e
+        cada uma fica visível assim que é atualizada: um updater que carrega
+        outra estrutura (ver load_derived) recebe a versão já atualizada.
+    """
+    cached = entry.value
+    new_rows = prepare_dataset(raw)
+    old = cached.dataset
+
+    dataset = concat_frames([old, new_rows])
+    if len(old) and len(new_rows) and new_rows['Order_Date'].iloc[0] < old['Order_Date'].iloc[-1]:
+        dataset = dataset.sort_values('Order_Date', kind='mergesort', ignore_index=True)
+
+    cached.dataset = freeze(dataset)
+
+    old, cached.derived = cached.derived, {}
+    for name, value in old.items():
+        # já refeita por um updater anterior que dependia dela
+        if name in cached.derived:
+            continue
+        updater = cached.updaters.get(name)
+        updated = updater(value, new_rows, cached.dataset) if updater is not None else None
+        if updated is not None:
+            cached.derived[name] = updated
+
+    return cached
+
+
+# Cache do processo: caminho absoluto -> SourceEntry com o _Dataset da
+# versão atual do csv
+_datasets = SourceCache(_full_dataset, _append_dataset)
+
+
+def refresh(path=DATASET_PATH):
+    """ Incorpora as mudanças do csv ao cache, se o dataset já foi carregado
+        (ver SourceCache.refresh).
+    """
+    _datasets.refresh(path)
+
+
+def load_dataset(path=DATASET_PATH):
+    """ Lê e limpa o dataset uma única vez por processo.
+
+        Todas as páginas recebem o mesmo dataframe limpo. A leitura só é
+        refeita quando o mtime ou o tamanho do csv mudam; se o csv apenas
+        recebeu linhas no fim, só essas linhas são lidas e limpas. Em um
+        processo novo o dataframe vem do snapshot colunar (ver
+        currycompany.snapshot), sem reprocessar o texto do csv.
+
+        O dataframe devolvido é um só por processo, compartilhado por todas
+        as sessões, e é somente leitura (ver freeze): as colunas derivadas
+        já vêm calculadas e as páginas só leem seleções dele, então uma
+        sessão nova não acrescenta cópias do dataset.
+
+        Imput: caminho do csv
+        Output: dataframe limpo, com as colunas derivadas (ver derive_columns)
+    """
+    return _datasets.load(path).value.dataset
+
+
+def load_derived(name, builder, path=DATASET_PATH, updater=None):
+    """ Estrutura derivada do dataset, construída uma vez por versão do csv.
+
+        O builder recebe o dataframe limpo e só é chamado de novo quando o
+        csv é reescrito. Quando o csv apenas recebe linhas novas, o
+        updater(valor, linhas_novas, dataset) atualiza a estrutura a partir
+        das linhas novas; sem updater (ou se ele devolver None) a estrutura
+        é refeita pelo builder.
+
+        Imput: nome da estrutura, função builder(df), caminho do csv, updater
+        Output: resultado do builder para a versão atual do dataset
+    """
+    with _datasets.lock:
+        cached = _datasets.load(path).value
+        if updater is not None:
+            cached.updaters[name] = updater
+        if name not in cached.derived:
+            with stage('build:' + name, len(cached.dataset)):
+                cached.derived[name] = builder(cached.dataset)
+
+        return cached.derived[name]
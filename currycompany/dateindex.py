@@ -0,0 +1,111 @@
+""" Índice de dias sobre o dataset ordenado por Order_Date.
+
+    O dataset é mantido em ordem de data (ver data.prepare_dataset), então
+    todos os pedidos de um dia ocupam um intervalo contínuo de linhas. O
+    índice guarda, para cada dia, a posição da primeira linha. O filtro do
+    slider ("pedidos antes da data X") vira uma busca binária e um prefixo
+    do dataframe, sem varrer nem copiar linhas.
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+from currycompany.data import DATASET_PATH, load_derived
+
+
+class DateIndex:
+    """ Dias distintos do dataset e o deslocamento (linha) de cada um.
+
+        Atributos:
+            days: array datetime64 com os dias em ordem crescente
+            offsets: offsets[i] é a primeira linha do dia days[i];
+                     o último elemento é o total de linhas
+            daily_orders: quantidade de pedidos em cada dia
+    """
+
+    def __init__(self, dates):
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+
+        # Como o array está ordenado, cada dia começa onde o valor muda
+        starts = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+        starts = np.concatenate([[0], starts]) if len(dates) else starts
+
+        self._set(dates[starts], np.append(starts, len(dates)))
+
+    def _set(self, days, offsets):
+        self.days = days
+        self.offsets = offsets
+        self.daily_orders = np.diff(offsets)
+
+    def extended(self, dates):
+        """ Índice com linhas novas acrescentadas ao fim do dataset.
+
+            Imput: datas (ordenadas) das linhas novas
+            Output: novo DateIndex, ou None se as linhas novas têm datas
+                    anteriores ao último dia (o dataset foi reordenado)
+        """
+        tail = DateIndex(dates)
+        if len(tail.days) == 0:
+            return self
+        if len(self.days) and tail.days[0] < self.days[-1]:
+            return None
+
+        total = self.offsets[-1]
+        days, starts = tail.days, tail.offsets[:-1] + total
+
+        # O primeiro dia novo pode continuar o último dia já indexado
+        if len(self.days) and days[0] == self.days[-1]:
+            days, starts = days[1:], starts[1:]
+
+        index = DateIndex.__new__(DateIndex)
+        index._set(np.concatenate([self.days, days]),
+                   np.concatenate([self.offsets[:-1], starts, [total + len(dates)]]))
+
+        return index
+
+    def replaced(self, keep, dates):
+        """ Índice com as primeiras keep linhas mantidas e as datas seguintes.
+
+            Imput: linhas mantidas (o começo de um dia, ver cube.kept_rows),
+                   datas (ordenadas) das linhas seguintes
+            Output: novo DateIndex
+        """
+        day = int(np.searchsorted(self.offsets[:-1], keep, side='left'))
+
+        head = DateIndex.__new__(DateIndex)
+        head._set(self.days[:day], np.append(self.offsets[:day], keep))
+
+        return head.extended(dates)
+
+    def day_position(self, date_limit):
+        """ Quantidade de dias anteriores à data limite (busca binária). """
+        return int(np.searchsorted(self.days, np.datetime64(date_limit, 'ns'), side='left'))
+
+    def row_position(self, date_limit):
+        """ Quantidade de linhas com Order_Date anterior à data limite. """
+        return int(self.offsets[self.day_position(date_limit)])
+
+    def daily_counts(self, date_limit):
+        """ Pedidos por dia antes da data limite, direto do índice.
+
+            Imput: data limite do slider
+            Output: dataframe com as colunas order_date e qtde_entregas
+        """
+        pos = self.day_position(date_limit)
+
+        return pd.DataFrame({'order_date': self.days[:pos],
+                             'qtde_entregas': self.daily_orders[:pos]})
+
+
+def build_date_index(df):
+    return DateIndex(df['Order_Date'].to_numpy())
+
+
+def update_date_index(index, new_rows, df):
+    return index.extended(new_rows['Order_Date'].to_numpy())
+
+
+def load_date_index(path=DATASET_PATH):
+    """ Índice de dias da versão atual do dataset. """
+    return load_derived('date_index', build_date_index, path, updater=update_date_index)
+
@@ -0,0 +1,122 @@
+""" Motor de filtros da barra lateral baseado em códigos categóricos.
+
+    Cada coluna filtrável é convertida uma única vez em códigos inteiros
+    (pd.factorize). Um multiselect vira uma tabela de consulta booleana
+    indexada pelo código, e todos os filtros ativos são combinados em uma
+    única máscara vetorizada. Como os dados estão ordenados por data, a
+    máscara só é calculada sobre o prefixo escolhido no slider.
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+FILTER_COLUMNS = ['City', 'Road_traffic_density', 'Weatherconditions',
+                  'Festival', 'Type_of_order']
+
+# Colunas que as páginas filtram pela barra lateral
+SIDEBAR_COLUMNS = ['Road_traffic_density']
+
+
+class CategoryCodes:
+    """ Códigos inteiros de uma coluna e os rótulos correspondentes.
+
+        Os rótulos são comparados sem os espaços do csv ('Low ' == 'Low').
+        Valores ausentes recebem o código -1 e nunca passam pelo filtro.
+    """
+
+    def __init__(self, values):
+        codes, labels = pd.factorize(values)
+
+        # Poucos rótulos por coluna: códigos de 8 bits bastam na prática
+        dtype = np.int8 if len(labels) < np.iinfo(np.int8).max else np.int32
+        self.codes = codes.astype(dtype)
+        self.labels = [str(label).strip() for label in labels]
+
+    def lookup(self, selected):
+        """ Tabela booleana código -> selecionado.
+
+            A última posição (False) atende o código -1 dos ausentes.
+        """
+        table = np.zeros(len(self.labels) + 1, dtype=bool)
+        table[:-1] = np.isin(self.labels, [str(s).strip() for s in selected])
+
+        return table
+
+    def extended(self, keep, values):
+        """ Códigos das primeiras keep linhas seguidos dos códigos de values.
+
+            Só values é fatorado; rótulos novos recebem os próximos códigos.
+
+            Imput: linhas mantidas, valores das linhas seguintes
+            Output: novo CategoryCodes
+        """
+        codes, labels = pd.factorize(values)
+
+        known, all_labels = {}, list(self.labels)
+        for code, label in enumerate(all_labels):
+            known.setdefault(label, code)
+
+        remap = []
+        for label in labels:
+            label = str(label).strip()
+            if label not in known:
+                known[label] = len(all_labels)
+                all_labels.append(label)
+            remap.append(known[label])
+
+        # a última posição (-1) leva os ausentes ao código -1
+        remap = np.array(remap + [-1], dtype='int64')
+
+        extended = CategoryCodes.__new__(CategoryCodes)
+        dtype = np.int8 if len(all_labels) < np.iinfo(np.int8).max else np.int32
+        extended.codes = np.concatenate([self.codes[:keep], remap[codes]]).astype(dtype)
+        extended.labels = all_labels
+
+        return extended
+
+
+class FilterIndex:
+    """ Códigos das colunas filtráveis de um dataframe ordenado por data. """
+
+    def __init__(self, df, columns=FILTER_COLUMNS):
+        self.columns = {col: CategoryCodes(df[col]) for col in columns}
+
+    def extended(self, keep, rows):
+        """ Índice com as primeiras keep linhas mantidas e as de rows em seguida.
+
+            Imput: linhas mantidas, dataframe das linhas seguintes
+            Output: novo FilterIndex
+        """
+        index = FilterIndex.__new__(FilterIndex)
+        index.columns = {col: codes.extended(keep, rows[col]) for col, codes in self.columns.items()}
+
+        return index
+
+    def active(self, selections):
+        """ Apenas os filtros que realmente descartam algum rótulo.
+
+            Imput: dicionário coluna -> lista de rótulos selecionados
+            Output: dicionário coluna -> tabela de consulta
+        """
+        tables = {}
+        for col, selected in selections.items():
+            if selected is None:
+                continue
+            table = self.columns[col].lookup(selected)
+            if not table[:-1].all():
+                tables[col] = table
+
+        return tables
+
+    def mask(self, selections, stop=None):
+        """ Máscara combinada dos filtros ativos sobre as linhas [0, stop).
+
+            Imput: dicionário coluna -> rótulos selecionados, fim do prefixo
+            Output: array booleano, ou None se nenhum filtro estiver ativo
+        """
+        mask = None
+        for col, table in self.active(selections).items():
+            selected = table[self.columns[col].codes[:stop]]
+            mask = selected if mask is None else mask & selected
+
+        return mask
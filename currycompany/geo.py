@@ -0,0 +1,66 @@
+""" Cálculos geográficos vetorizados sobre colunas de coordenadas. """
+# libraries
+import numpy as np
+
+from currycompany.instrument import timed
+
+# Raio médio da Terra em km, o mesmo usado pelo pacote haversine
+EARTH_RADIUS_KM = 6371.0088
+
+COORDINATE_COLUMNS = ['Restaurant_latitude', 'Restaurant_longitude',
+                      'Delivery_location_latitude', 'Delivery_location_longitude']
+
+# Coordenadas (em graus, já com o sinal corrigido) abaixo disso são tratadas
+# como ausentes: no csv os restaurantes sem localização vêm com 0.0 e a
+# entrega correspondente fica a poucos centésimos de grau de (0, 0)
+MIN_VALID_DEGREES = 1.0
+
+
+def clean_coordinates(df):
+    """ Corrige as coordenadas inválidas do csv em uma única passada vetorizada.
+
+        - negativas: o csv tem latitudes com o sinal trocado (todas as
+          entregas ficam ao norte do equador e a leste de Greenwich), então
+          o sinal é removido
+        - zero ou perto de zero (ver MIN_VALID_DEGREES): viram NaN
+
+        Imput: dataframe com as colunas de coordenadas
+        Output: o mesmo dataframe com as coordenadas corrigidas
+    """
+    coords = np.abs(df[COORDINATE_COLUMNS].to_numpy(dtype='float64'))
+    coords[coords < MIN_VALID_DEGREES] = np.nan
+
+    for position, col in enumerate(COORDINATE_COLUMNS):
+        df[col] = coords[:, position]
+
+    return df
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """ Distância de grande círculo (km) entre arrays de pontos.
+
+        Mesma fórmula do pacote haversine, mas calculada para todas as
+        linhas de uma vez com NumPy em vez de uma chamada por linha.
+
+        Imput: latitudes e longitudes (graus) de origem e destino
+        Output: array com as distâncias em km
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype='float64')) for x in (lat1, lon1, lat2, lon2))
+
+    d = (np.sin((lat2 - lat1) * 0.5) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(d))
+
+
+@timed('distance')
+def delivery_distance(df):
+    """ Distância entre o restaurante e o local de entrega de cada pedido.
+
+        Imput: dataframe com as colunas de coordenadas do dataset
+        Output: array com a distância em km de cada linha
+    """
+    return haversine_np(df['Restaurant_latitude'].to_numpy(),
+                        df['Restaurant_longitude'].to_numpy(),
+                        df['Delivery_location_latitude'].to_numpy(),
+                        df['Delivery_location_longitude'].to_numpy())
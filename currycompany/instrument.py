@@ -0,0 +1,239 @@
+""" Instrumentação das etapas do dashboard: tempo, linhas e memória.
+
+    Ligada com CURRYCOMPANY_PROFILE=1 (ver config). Cada etapa (leitura do
+    csv, limpeza, filtros, agregações, gráficos, mapas, visões) é envolvida
+    por stage() ou @timed e gera um registro com o tempo, as linhas
+    processadas e a variação da memória residente do processo. Os registros
+    de uma execução da página ficam disponíveis no painel da barra lateral
+    (show_panel) e cada um também é enviado como uma linha json ao logger
+    'currycompany.instrument'.
+
+    Desligada (padrão), stage() devolve um contexto vazio já pronto e @timed
+    devolve a própria função, então o custo fica perto de zero.
+"""
+# libraries
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from currycompany import config
+
+# resource só existe em sistemas Unix; no Windows a memória não é medida
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger('currycompany.instrument')
+
+# Registros da execução atual de cada thread (cada sessão do Streamlit roda
+# a página na sua própria thread)
+_local = threading.local()
+
+_NULL = contextlib.nullcontext()
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class StageRecord:
+    """ Medição de uma etapa.
+
+        depth é o nível de aninhamento (0 para as etapas de fora) e self_s o
+        tempo da etapa sem o das etapas internas: em uma visão, self_s é o
+        tempo de serialização e desenho das figuras.
+    """
+
+    __slots__ = ('name', 'depth', 'rows', 'wall_s', 'self_s', 'rss_delta_mb', 'cached',
+                 '_children_s')
+
+    def __init__(self, name, depth, rows=None):
+        self.name = name
+        self.depth = depth
+        self.rows = rows
+        self.wall_s = None
+        self.self_s = None
+        self.rss_delta_mb = None
+        self.cached = None
+        self._children_s = 0.0
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if not slot.startswith('_')}
+
+
+class _Run:
+    """ Etapas de uma execução. Threads sem start_run (ex.: o observador do
+        csv) só enviam os registros ao logger, sem acumulá-los.
+
+        As threads do pool de relatórios (ver in_current_run) usam um _Run
+        próprio que acrescenta os registros à lista da execução que as
+        chamou, a partir do nível de aninhamento em que ela estava.
+    """
+
+    def __init__(self, name, keep, records=None, depth=0):
+        self.name = name
+        self.keep = keep
+        self.records = [] if records is None else records
+        self.stack = []
+        self.depth = depth
+
+
+def _rss_bytes():
+    """ Memória residente atual do processo (pico, fora do Linux; 0 sem
+        o módulo resource).
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _current_run():
+    run = getattr(_local, 'run', None)
+    if run is None:
+        run = _local.run = _Run(threading.current_thread().name, keep=False)
+
+    return run
+
+
+def count_rows(value):
+    """ Linhas de um resultado (dataframe, series, array); None se não se aplica. """
+    shape = getattr(value, 'shape', None)
+
+    return shape[0] if shape else None
+
+
+def start_run(name):
+    """ Começa uma nova execução da página na thread atual (descarta a anterior). """
+    if config.PROFILE:
+        _local.run = _Run(name, keep=True)
+
+
+def records():
+    """ Registros da execução atual da thread, na ordem em que começaram. """
+    run = getattr(_local, 'run', None)
+
+    return [] if run is None else list(run.records)
+
+
+@contextlib.contextmanager
+def _stage(name, rows):
+    run = _current_run()
+    record = StageRecord(name, run.depth + len(run.stack), rows)
+    if run.keep:
+        run.records.append(record)
+    run.stack.append(record)
+
+    rss = _rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.wall_s = time.perf_counter() - start
+        record.self_s = record.wall_s - record._children_s
+        record.rss_delta_mb = (_rss_bytes() - rss) / 2 ** 20
+
+        run.stack.pop()
+        if run.stack:
+            run.stack[-1]._children_s += record.wall_s
+
+        logger.info(json.dumps(dict(record.as_dict(), run=run.name)))
+
+
+def in_current_run(func):
+    """ func para rodar em outra thread com as etapas na execução atual.
+
+        Os registros feitos por func entram no painel da execução desta
+        thread, aninhados na etapa aberta no momento. Desligada, devolve a
+        própria função.
+
+        Imput: função
+        Output: função
+    """
+    run = getattr(_local, 'run', None)
+    if not config.PROFILE or run is None:
+        return func
+
+    depth = run.depth + len(run.stack)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, 'run', None)
+        _local.run = _Run(run.name, run.keep, run.records, depth)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.run = previous
+
+    return wrapper
+
+
+def stage(name, rows=None):
+    """ Contexto que mede uma etapa.
+
+        O registro é devolvido pelo with para que as linhas possam ser
+        informadas depois (record.rows = len(df)). Desligada, devolve um
+        contexto vazio e o with recebe None.
+
+        Imput: nome da etapa, linhas processadas (se já conhecidas)
+        Output: context manager
+    """
+    if not config.PROFILE:
+        return _NULL
+
+    return _stage(name, rows)
+
+
+def timed(name):
+    """ Decorator: mede cada chamada da função como uma etapa.
+
+        As linhas são as do resultado (ver count_rows). Desligada, a própria
+        função é devolvida, sem nenhum custo por chamada.
+    """
+    def decorator(func):
+        if not config.PROFILE:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _stage(name, None) as record:
+                result = func(*args, **kwargs)
+                record.rows = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def show_panel():
+    """ Painel da barra lateral com as etapas da execução atual.
+
+        Só aparece com a instrumentação ligada. Além da tabela, oferece o
+        download dos registros em json (uma linha por etapa).
+    """
+    if not config.PROFILE:
+        return
+
+    import pandas as pd
+    import streamlit as st
+
+    table = pd.DataFrame([record.as_dict() for record in records()])
+    if table.empty:
+        return
+
+    table['name'] = ['  ' * depth + name for depth, name in zip(table['depth'], table['name'])]
+    total = table.loc[table['depth'] == 0, 'wall_s'].sum()
+
+    with st.sidebar.expander('Debug: etapas ({:.3f}s)'.format(total)):
+        st.dataframe(table.drop(columns='depth'))
+        st.download_button('Exportar registros',
+                           '\n'.join(json.dumps(record.as_dict()) for record in records()),
+                           file_name='currycompany-etapas.jsonl',
+                           mime='application/json')
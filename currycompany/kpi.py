@@ -0,0 +1,77 @@
+""" Indicadores (cards de st.metric) declarados pelas páginas.
+
+    Cada página lista os seus indicadores como Kpi e o evaluate calcula todos
+    de uma vez: os indicadores do cubo que usam a mesma dimensão dividem um
+    único rollup, e os indicadores do rollup por entregador saem de uma única
+    agregação. Um card novo custa só uma leitura a mais em tabelas já
+    calculadas.
+"""
+# libraries
+from collections import namedtuple
+
+import pandas as pd
+
+from currycompany.cube import rollup
+
+# label: texto do card
+# source: 'cube' (cubo de métricas) ou 'riders' (rollup por entregador)
+# column: coluna do rollup do cubo (ex.: 'time_mean', 'orders') ou do
+#         rollup por entregador (ex.: 'age_max')
+# stat: agregação da coluna do rollup por entregador ('max', 'min',
+#       'sum', 'nunique'); não é usado no cubo
+# where: (dimensão, valor) para ler uma única célula do cubo, ex.:
+#        ('Festival', 'Yes'); None para o total
+# digits: casas decimais do valor exibido (None mantém o valor)
+Kpi = namedtuple('Kpi', ['label', 'source', 'column', 'stat', 'where', 'digits'],
+                 defaults=(None, None, None))
+
+
+def _cube_tables(kpis, cube):
+    """ Um rollup do cubo por dimensão usada pelos indicadores. """
+    dimensions = {kpi.where[0] if kpi.where else None
+                  for kpi in kpis if kpi.source == 'cube'}
+
+    return {dim: rollup(cube, [dim] if dim else []) for dim in dimensions}
+
+
+def _rider_stats(kpis, riders):
+    """ As agregações do rollup por entregador, um único agg por coluna.
+
+        Cada coluna é agregada separadamente para manter o tipo dos valores
+        (uma tabela única misturaria inteiros e floats).
+    """
+    aggs = {}
+    for kpi in kpis:
+        if kpi.source == 'riders' and kpi.stat not in aggs.setdefault(kpi.column, []):
+            aggs[kpi.column].append(kpi.stat)
+
+    return {column: riders[column].agg(stats) for column, stats in aggs.items()}
+
+
+def evaluate(kpis, cube=None, riders=None):
+    """ Calcula os valores de todos os indicadores de uma página.
+
+        Imput: lista de Kpi, cubo e rollup por entregador já filtrados
+               (só é preciso passar as fontes usadas pelos indicadores)
+        Output: lista de valores na ordem dos indicadores; None quando a
+                célula pedida não existe na seleção
+    """
+    tables = _cube_tables(kpis, cube)
+    stats = _rider_stats(kpis, riders)
+
+    values = []
+    for kpi in kpis:
+        if kpi.source == 'cube':
+            table = tables[kpi.where[0] if kpi.where else None]
+            row = kpi.where[1] if kpi.where else 0
+            value = table.at[row, kpi.column] if row in table.index else None
+        elif kpi.source == 'riders':
+            value = stats[kpi.column][kpi.stat]
+        else:
+            raise ValueError('Fonte de indicador desconhecida: {}'.format(kpi.source))
+
+        if value is not None and kpi.digits is not None and not pd.isna(value):
+            value = round(value, kpi.digits)
+        values.append(value)
+
+    return values
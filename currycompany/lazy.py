@@ -0,0 +1,60 @@
+""" Importação sob demanda das bibliotecas pesadas de visualização.
+
+    plotly.express, folium e streamlit_folium levam centenas de ms para
+    importar. Com lazy_import o módulo só é importado no primeiro acesso a
+    um atributo (px.bar, folium.Map, ...), ou seja, quando a visão que usa
+    a biblioteca é desenhada; páginas e visões que não a usam, e gráficos
+    servidos pelo cache de figuras, não pagam a importação.
+
+    O orçamento de importação de cada página é medido com
+    python -m benchmarks.importtime.
+"""
+# libraries
+import importlib
+import threading
+
+from currycompany.instrument import stage
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """ Representante de um módulo que só é importado no primeiro uso. """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    with stage('import:' + self._name):
+                        module = importlib.import_module(self._name)
+                    self.__dict__['_module'] = module
+
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'importado' if self.__dict__['_module'] is not None else 'não importado'
+        return '<LazyModule {} ({})>'.format(self._name, state)
+
+
+def lazy_import(name):
+    """ Módulo name, importado só no primeiro acesso a um atributo.
+
+        Imput: nome completo do módulo (ex.: 'plotly.express')
+        Output: LazyModule
+    """
+    return LazyModule(name)
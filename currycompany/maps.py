@@ -0,0 +1,158 @@
+""" Mapa geográfico das entregas, com o HTML em cache por estado de filtro.
+
+    O mapa tem cinco modos:
+        - medians: um marcador por cidade e trânsito (mediana das entregas)
+        - cluster: cada pedido como um ponto, agrupados no navegador
+        - heatmap: camada de densidade dos pedidos
+        - grid, restaurant_grid: células da grade espacial (ver spatial) das
+          entregas ou dos restaurantes, coloridas pela quantidade de pedidos,
+          com o tempo médio de entrega no tooltip
+
+    Nos modos por pedido os marcadores são montados em JavaScript a partir
+    de uma única lista de coordenadas (FastMarkerCluster/HeatMap), em vez de
+    um objeto folium por ponto. O HTML pronto fica no cache de figuras, então
+    reabrir o mapa com os mesmos filtros não reconstrói nada.
+"""
+# libraries
+import numpy as np
+
+from currycompany import config
+from currycompany.cache import figure_cache
+from currycompany.data import DATASET_PATH
+from currycompany.instrument import timed
+from currycompany.lazy import lazy_import
+from currycompany.selection import grid_cells, map_locations, map_points, state_key
+
+# folium só é importado quando um mapa é montado (HTML fora do cache)
+folium = lazy_import('folium')
+plugins = lazy_import('folium.plugins')
+
+# rótulo exibido -> modo do mapa
+MAP_MODES = {
+    'Medianas por cidade': 'medians',
+    'Pedidos agrupados': 'cluster',
+    'Mapa de calor': 'heatmap',
+    'Grade de entregas': 'grid',
+    'Grade de restaurantes': 'restaurant_grid',
+}
+
+# modo de grade -> ponto da grade espacial
+GRID_MODES = {'grid': 'delivery', 'restaurant_grid': 'restaurant'}
+
+# Nos modos de grade só as células com mais pedidos são desenhadas (um
+# retângulo por célula)
+MAX_GRID_CELLS = 5_000
+
+# Cores das células, da menor para a maior quantidade de pedidos (quintis)
+GRID_COLORS = ['#ffffb2', '#fecc5c', '#fd8d3c', '#f03b20', '#bd0026']
+
+# Acima disso os pontos são amostrados em intervalos regulares, para manter
+# o HTML enviado ao navegador limitado
+MAX_POINTS = 300_000
+
+# Casas decimais das coordenadas enviadas ao navegador (5 casas ~ 1 m). As
+# colunas float32 do dataset (ver schema) viram números de 16 dígitos no
+# HTML se não forem arredondadas
+COORDINATE_DECIMALS = 5
+
+
+def _sample(points, limit=MAX_POINTS):
+    if len(points) <= limit:
+        return points
+
+    return points[np.linspace(0, len(points) - 1, limit).astype('int64')]
+
+
+@timed('map_build')
+def build_map(date_limit, selections, mode, path=DATASET_PATH):
+    """ Monta o folium.Map para o estado da barra lateral.
+
+        Imput: data limite, dicionário coluna -> rótulos, modo, caminho do csv
+        Output: folium.Map
+    """
+    if mode == 'medians':
+        df_aux = map_locations(date_limit, selections, path)
+        map = folium.Map()
+
+        rows = df_aux[['Delivery_location_latitude', 'Delivery_location_longitude',
+                       'City', 'Road_traffic_density']].to_numpy().tolist()
+        for lat, lon, city, traffic in rows:
+            folium.Marker([lat, lon], popup='{} / {}'.format(city, traffic)).add_to(map)
+
+        return map
+
+    if mode in GRID_MODES:
+        return _grid_map(grid_cells(date_limit, selections, GRID_MODES[mode], path=path))
+
+    points = _sample(map_points(date_limit, selections, path))
+    points[:, :2] = points[:, :2].round(COORDINATE_DECIMALS)
+    map = folium.Map()
+    if len(points):
+        map.fit_bounds([points[:, :2].min(axis=0).tolist(), points[:, :2].max(axis=0).tolist()])
+
+    if mode == 'cluster':
+        plugins.FastMarkerCluster(points[:, :2].tolist()).add_to(map)
+    elif mode == 'heatmap':
+        plugins.HeatMap(points.tolist(), radius=8).add_to(map)
+    else:
+        raise ValueError('modo de mapa desconhecido: {!r}'.format(mode))
+
+    return map
+
+
+def _grid_map(cells, limit=MAX_GRID_CELLS):
+    """ Mapa com um retângulo por célula da grade (ver selection.grid_cells). """
+    if len(cells) > limit:
+        cells = cells.nlargest(limit, 'orders', keep='first').sort_index()
+
+    map = folium.Map()
+    if not len(cells):
+        return map
+
+    degrees = config.GRID_DEGREES
+    south, west = cells['latitude'].to_numpy(), cells['longitude'].to_numpy()
+    map.fit_bounds([[south.min(), west.min()], [south.max() + degrees, west.max() + degrees]])
+
+    orders = cells['orders'].to_numpy()
+    quintiles = np.quantile(orders, [0.2, 0.4, 0.6, 0.8])
+    colors = np.searchsorted(quintiles, orders, side='left')
+
+    # uma única camada GeoJson com todas as células, em vez de um objeto
+    # folium por célula
+    features = []
+    rows = zip(south.tolist(), west.tolist(), orders.tolist(),
+               cells['time_mean'].to_numpy().round(1).tolist(), colors.tolist())
+    for lat, lon, n, minutes, color in rows:
+        ring = [[lon, lat], [lon + degrees, lat], [lon + degrees, lat + degrees],
+                [lon, lat + degrees], [lon, lat]]
+        features.append({'type': 'Feature',
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                         'properties': {'orders': n, 'time_mean': minutes, 'color': GRID_COLORS[color]}})
+
+    folium.GeoJson({'type': 'FeatureCollection', 'features': features},
+                   style_function=lambda feature: {'fillColor': feature['properties']['color'],
+                                                   'fillOpacity': 0.6, 'weight': 0},
+                   tooltip=folium.GeoJsonTooltip(['orders', 'time_mean'],
+                                                 aliases=['Pedidos', 'Tempo médio (min)'])).add_to(map)
+
+    return map
+
+
+@timed('folium_render')
+def _render(map):
+    # Mesmo HTML que o streamlit_folium.folium_static gera
+    return folium.Figure().add_child(map).render()
+
+
+def map_html(date_limit, selections, mode, path=DATASET_PATH):
+    """ HTML do mapa, em cache por versão do dataset e estado dos filtros.
+
+        Usa o mesmo cache das figuras (ver cache.figure_cache).
+
+        Imput: data limite, dicionário coluna -> rótulos, modo, caminho do csv
+        Output: HTML pronto para st.components.v1.html
+    """
+    key = ('map_html', state_key(date_limit, selections, path), mode, path)
+
+    return figure_cache.get_or_compute(
+        key, lambda: _render(build_map(date_limit, selections, mode, path)))
@@ -0,0 +1,33 @@
+""" Preparação comum das páginas do dashboard.
+
+    Cada página chama page_setup(nome) logo depois do st.set_page_config,
+    que:
+        - inicia o observador do csv (ver watch), que incorpora as linhas
+          novas em segundo plano, se configurado;
+        - aquece dados e relatórios da visão padrão (ver warmup), se o
+          processo ainda não o fez;
+        - abre a execução da página para o painel de debug (ver instrument).
+
+    As páginas só desenham. O dataset (ou os agregados, ou o arquivo SQLite)
+    é carregado uma única vez por processo; a data limite do slider vira um
+    prefixo dos dados ordenados por data e os filtros da barra lateral uma
+    única máscara sobre ele. Cards, gráficos e tabelas vêm dos relatórios de
+    currycompany.reports. Cada visão começa com get_reports, com os
+    relatórios que ela usa: eles são calculados juntos no pool de threads
+    (ver parallel), e os get_report seguintes os pegam do cache.
+"""
+# libraries
+from currycompany.instrument import start_run
+from currycompany.warmup import ensure_warmup
+from currycompany.watch import ensure_watcher
+
+
+def page_setup(name):
+    """ Prepara uma execução da página.
+
+        Imput: nome da página para a instrumentação (ex.: '1_visao_empresa')
+        Output: None
+    """
+    ensure_watcher()
+    ensure_warmup()
+    start_run(name)
@@ -0,0 +1,63 @@
+""" Pool de threads para calcular ao mesmo tempo os relatórios de uma visão.
+
+    Os relatórios de uma visão são agregações independentes sobre os mesmos
+    dados somente leitura (o dataset compartilhado, o cubo e o rollup por
+    entregador; ver data.freeze). Em threads todos leem os mesmos arrays,
+    sem cópia nem serialização, e as agregações do pandas/NumPy liberam o
+    GIL na maior parte do tempo; assim o tempo da visão tende ao do
+    relatório mais lento em vez da soma de todos.
+
+    O pool é criado no primeiro uso e compartilhado por todas as sessões.
+    O número de threads vem de CURRYCOMPANY_WORKERS (ver config).
+"""
+# libraries
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from currycompany import config
+from currycompany.instrument import in_current_run
+
+_executor = None
+_lock = threading.Lock()
+
+# marca as threads do pool: tarefas que chamam run_all rodam as suas
+# subtarefas na própria thread, para não esperar por threads ocupadas
+_local = threading.local()
+
+
+def _worker_init():
+    _local.worker = True
+
+
+def _pool():
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.WORKERS,
+                                           thread_name_prefix='currycompany-worker',
+                                           initializer=_worker_init)
+
+    return _executor
+
+
+def run_all(tasks):
+    """ Executa funções sem argumentos no pool e devolve os resultados.
+
+        Com uma thread só, uma tarefa só ou dentro de uma tarefa do pool as
+        funções rodam na thread atual. Uma exceção em qualquer tarefa é
+        levantada aqui, depois que todas terminaram.
+
+        Imput: lista de funções sem argumentos
+        Output: lista com os resultados, na ordem das funções
+    """
+    if config.WORKERS <= 1 or len(tasks) <= 1 or getattr(_local, 'worker', False):
+        return [task() for task in tasks]
+
+    futures = [_pool().submit(in_current_run(task)) for task in tasks]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+
+    return [future.result() for future in futures]
@@ -0,0 +1,84 @@
+""" Backends de consulta dos relatórios: pandas (referência) ou SQLite.
+
+    Os relatórios (ver reports) são escritos sobre quatro consultas:
+
+        cells(date_limit, selections)        células do cubo de métricas
+        rollup(date_limit, selections, by)   contagem, média e desvio por dimensões
+        riders(date_limit, selections)       rollup diário por entregador
+        daily_orders(date_limit, selections) pedidos por dia
+
+    O backend 'pandas' (padrão) responde a partir do cubo e do rollup em
+    memória (ou da ingestão em blocos, no modo 'stream'). O backend 'sqlite'
+    responde com GROUP BYs sobre um arquivo SQLite construído a partir do
+    csv limpo (ver sqlbackend), sem o dataframe de pedidos em memória. Os
+    dois devolvem os mesmos dataframes; o backend é escolhido com
+    CURRYCOMPANY_BACKEND (ver config).
+"""
+# libraries
+from currycompany import config, sqlbackend
+from currycompany.cache import figure_cache
+from currycompany.cube import rollup as rollup_cube
+from currycompany.data import DATASET_PATH
+from currycompany.selection import daily_orders as select_daily_orders
+from currycompany.selection import normalized_state, select_cells, select_riders, state_key
+
+
+class PandasBackend:
+    """ Consultas sobre o cubo e o rollup por entregador (ver selection). """
+
+    name = 'pandas'
+
+    def cells(self, date_limit, selections, path=DATASET_PATH):
+        return select_cells(date_limit, selections, path)
+
+    def rollup(self, date_limit, selections, by, path=DATASET_PATH):
+        return rollup_cube(select_cells(date_limit, selections, path), by)
+
+    def riders(self, date_limit, selections, path=DATASET_PATH):
+        return select_riders(date_limit, selections, path)
+
+    def daily_orders(self, date_limit, selections, path=DATASET_PATH):
+        return select_daily_orders(date_limit, selections, path)
+
+
+class SQLiteBackend:
+    """ Consultas sobre o arquivo SQLite do csv limpo (ver sqlbackend).
+
+        O estado da barra lateral é normalizado antes (ver
+        selection.normalized_state): a consulta recebe o último dia e só os
+        filtros que descartam algum rótulo. Células e rollup por entregador,
+        usados por vários relatórios do mesmo estado, ficam no cache de
+        figuras e agregados, então cada um é consultado uma vez por estado.
+    """
+
+    name = 'sqlite'
+
+    def _shared(self, name, date_limit, selections, path, compute):
+        key = ('query', self.name, name, state_key(date_limit, selections, path), path)
+
+        return figure_cache.get_or_compute(
+            key, lambda: compute(normalized_state(date_limit, selections, path), path))
+
+    def cells(self, date_limit, selections, path=DATASET_PATH):
+        return self._shared('cells', date_limit, selections, path, sqlbackend.cells)
+
+    def rollup(self, date_limit, selections, by, path=DATASET_PATH):
+        return sqlbackend.rollup(normalized_state(date_limit, selections, path), by, path)
+
+    def riders(self, date_limit, selections, path=DATASET_PATH):
+        return self._shared('riders', date_limit, selections, path, sqlbackend.riders)
+
+    def daily_orders(self, date_limit, selections, path=DATASET_PATH):
+        return sqlbackend.daily_orders(normalized_state(date_limit, selections, path), path)
+
+
+BACKENDS = {backend.name: backend for backend in (PandasBackend(), SQLiteBackend())}
+
+
+def backend():
+    """ Backend configurado em CURRYCOMPANY_BACKEND. """
+    try:
+        return BACKENDS[config.QUERY_BACKEND]
+    except KeyError:
+        raise ValueError('backend de consulta desconhecido: {!r} (opções: {})'.format(
+            config.QUERY_BACKEND, ', '.join(sorted(BACKENDS)))) from None
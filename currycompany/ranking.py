@@ -0,0 +1,65 @@
+""" Ranking dos entregadores mais rápidos e mais lentos de cada cidade.
+
+    O tempo médio de cada entregador por cidade é calculado uma única vez a
+    partir do rollup por entregador. Depois, para cada cidade presente nos
+    dados, os k menores e os k maiores tempos são escolhidos com seleção
+    parcial (np.partition), sem ordenar a cidade inteira. Só os k
+    escolhidos (e os empatados com o k-ésimo) são ordenados.
+"""
+# libraries
+import numpy as np
+
+RANK_COLUMNS = ['City', 'Delivery_person_ID', 'Time_taken(min)']
+
+
+def rider_times(riders):
+    """ Tempo médio de entrega de cada entregador em cada cidade.
+
+        Imput: rollup por entregador (ver riders)
+        Output: dataframe com City, Delivery_person_ID e Time_taken(min)
+    """
+    sums = riders.groupby(['City', 'Delivery_person_ID'], sort=False, observed=True)[['orders', 'time_sum']].sum()
+    times = (sums['time_sum'] / sums['orders']).rename('Time_taken(min)')
+
+    return times.reset_index()
+
+
+def _select(values, ids, k, largest):
+    """ Posições dos k menores (ou maiores) valores, já ordenadas.
+
+        Empates são desfeitos pelo ID: a seleção parcial só encontra o
+        k-ésimo valor, e todos os entregadores até ele (inclusive os
+        empatados) são ordenados por (valor, ID) antes do corte em k.
+    """
+    keys = -values if largest else values
+    if len(keys) > k:
+        kth = np.partition(keys, k - 1)[k - 1]
+        chosen = np.flatnonzero(keys <= kth)
+    else:
+        chosen = np.arange(len(keys))
+
+    return chosen[np.lexsort((ids[chosen], keys[chosen]))][:k]
+
+
+def rank_riders(riders, k=10):
+    """ Os k entregadores mais rápidos e os k mais lentos de cada cidade.
+
+        Imput: rollup por entregador, quantidade por cidade
+        Output: (mais_rapidos, mais_lentos), dataframes com RANK_COLUMNS,
+                agrupados por cidade em ordem alfabética
+    """
+    times = rider_times(riders)
+
+    values = times['Time_taken(min)'].to_numpy()
+    ids = times['Delivery_person_ID'].to_numpy().astype(str)
+
+    fastest, slowest = [], []
+    for city, positions in sorted(times.groupby('City', sort=False, observed=True).indices.items()):
+        fastest.append(positions[_select(values[positions], ids[positions], k, largest=False)])
+        slowest.append(positions[_select(values[positions], ids[positions], k, largest=True)])
+
+    def _table(parts):
+        positions = np.concatenate(parts) if parts else np.array([], dtype='int64')
+        return times.take(positions)[RANK_COLUMNS].reset_index(drop=True)
+
+    return _table(fastest), _table(slowest)
@@ -0,0 +1,321 @@
+""" Relatórios (agregados) por trás de cada gráfico, tabela e card.
+
+    Cada relatório é uma função (data limite, filtros, caminho do csv) que
+    devolve um dataframe pequeno, sem Streamlit e sem Plotly: as páginas só
+    desenham o que get_report devolve, e get_reports calcula ao mesmo tempo
+    os relatórios de uma visão (ver parallel). get_report usa, nesta ordem,
+    o cache de figuras e agregados do processo, os relatórios pré-calculados
+    (ver store) e por fim o cálculo pelo backend de consultas configurado
+    (ver query): o cubo e o rollup por entregador em memória ou o arquivo
+    SQLite.
+
+    Pré-calcular os relatórios de um conjunto de datas e filtros:
+
+        python -m currycompany.reports
+        python -m currycompany.reports --dates 2022-03-01 2022-04-07 --traffic Low,Medium Jam
+        python -m currycompany.reports --format json
+"""
+# libraries
+import argparse
+import datetime
+import functools
+
+import pandas as pd
+
+from currycompany import query, store
+from currycompany.cache import figure_cache
+from currycompany.data import DATASET_PATH, source_signature
+from currycompany.kpi import Kpi, evaluate
+from currycompany.parallel import run_all
+from currycompany.ranking import rank_riders
+from currycompany.selection import normalized_state, state_key, state_space
+from currycompany.timeseries import bucket_frame, count_unique, resample
+
+# nome do relatório -> função(date_limit, selections, path)
+REPORTS = {}
+
+
+def report(name):
+    """ Decorator: registra a função como o relatório name. """
+    def decorator(func):
+        REPORTS[name] = func
+        return func
+
+    return decorator
+
+
+def get_report(name, date_limit, selections, path=DATASET_PATH):
+    """ Relatório de um estado da barra lateral.
+
+        Imput: nome do relatório (ver REPORTS), data limite, dicionário
+               coluna -> rótulos, caminho do csv
+        Output: dataframe (compartilhado; tratar como somente leitura)
+    """
+    def compute():
+        signature = source_signature(path)
+        frame = store.read_report(path, signature, name,
+                                  normalized_state(date_limit, selections, path))
+        if frame is None:
+            frame = REPORTS[name](date_limit, selections, path)
+        return frame
+
+    return figure_cache.get_or_compute(('report', name, state_key(date_limit, selections, path), path),
+                                       compute)
+
+
+def get_reports(names, date_limit, selections, path=DATASET_PATH):
+    """ Vários relatórios do mesmo estado, calculados ao mesmo tempo.
+
+        Os relatórios ausentes do cache são calculados no pool de threads
+        (ver parallel); as páginas chamam get_reports com os relatórios de
+        uma visão antes de desenhá-la, e os get_report seguintes vêm do
+        cache.
+
+        Imput: nomes dos relatórios, data limite, dicionário coluna ->
+               rótulos, caminho do csv
+        Output: dicionário nome -> dataframe
+    """
+    frames = run_all([functools.partial(get_report, name, date_limit, selections, path)
+                      for name in names])
+
+    return dict(zip(names, frames))
+
+
+# ---------------------------------------
+# Indicadores (cards)
+# ---------------------------------------
+# Cards da visão entregadores, calculados em uma única agregação do rollup
+# por entregador
+RIDER_KPIS = {
+    'age_max': Kpi('Maior de idade', 'riders', 'age_max', stat='max'),
+    'age_min': Kpi('Menor de idade', 'riders', 'age_min', stat='min'),
+    'vehicle_max': Kpi('A Melhor condição', 'riders', 'vehicle_max', stat='max'),
+    'vehicle_min': Kpi('A Pior condição', 'riders', 'vehicle_min', stat='min'),
+}
+
+# Cards da visão restaurantes: tempo e desvio padrão com e sem festival
+# saem de um único rollup do cubo por Festival
+RESTAURANT_KPIS = {
+    'unique_riders': Kpi('Entregadores únicos', 'riders', 'Delivery_person_ID', stat='nunique'),
+    'distance_mean': Kpi('A distância média das entregas', 'cube', 'distance_mean', digits=2),
+    'festival_time_mean': Kpi('Tempo médio de entrega', 'cube', 'time_mean',
+                              where=('Festival', 'Yes'), digits=2),
+    'festival_time_std': Kpi('Tempo médio de entrega', 'cube', 'time_std',
+                             where=('Festival', 'Yes'), digits=2),
+    'regular_time_mean': Kpi('Tempo médio de entrega', 'cube', 'time_mean',
+                             where=('Festival', 'No'), digits=2),
+    'regular_time_std': Kpi('Desvio Padrão', 'cube', 'time_std',
+                            where=('Festival', 'No'), digits=2),
+}
+
+
+def _kpi_frame(kpis, values):
+    # uma linha, uma coluna por card (cada uma com o seu tipo)
+    return pd.DataFrame({name: [value] for name, value in zip(kpis, values)})
+
+
+@report('rider_kpis')
+def rider_kpis(date_limit, selections, path=DATASET_PATH):
+    riders = query.backend().riders(date_limit, selections, path)
+    values = evaluate(list(RIDER_KPIS.values()), riders=riders)
+
+    return _kpi_frame(RIDER_KPIS, values)
+
+
+@report('restaurant_kpis')
+def restaurant_kpis(date_limit, selections, path=DATASET_PATH):
+    values = evaluate(list(RESTAURANT_KPIS.values()),
+                      cube=query.backend().cells(date_limit, selections, path),
+                      riders=query.backend().riders(date_limit, selections, path))
+
+    return _kpi_frame(RESTAURANT_KPIS, values)
+
+
+# ---------------------------------------
+# Visão empresa
+# ---------------------------------------
+# As séries de datas têm um ponto por período (coluna period), com o
+# período escolhido pela extensão selecionada (coluna bucket, ver
+# timeseries): dia, semana, mês, ...
+@report('orders_by_date')
+def orders_by_date(date_limit, selections, path=DATASET_PATH):
+    # contagem por dia vinda do índice de datas ou do cubo, somada por período
+    df_aux = query.backend().daily_orders(date_limit, selections, path)
+    bucket, starts, orders = resample(df_aux['order_date'], df_aux['qtde_entregas'].to_numpy())
+
+    return bucket_frame(bucket, starts, orders, 'qtde_entregas')
+
+
+@report('traffic_order_share')
+def traffic_order_share(date_limit, selections, path=DATASET_PATH):
+    df_aux = (query.backend().rollup(date_limit, selections, ['Road_traffic_density'], path)[['orders']]
+                .rename(columns={'orders': 'ID'})
+                .reset_index())
+    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
+
+    return df_aux
+
+
+@report('traffic_order_city')
+def traffic_order_city(date_limit, selections, path=DATASET_PATH):
+    return (query.backend().rollup(date_limit, selections, ['City', 'Road_traffic_density'], path)[['orders']]
+              .rename(columns={'orders': 'ID'})
+              .reset_index())
+
+
+@report('orders_by_week')
+def orders_by_week(date_limit, selections, path=DATASET_PATH):
+    # pedidos por dia do cubo somados por semana (ou período maior)
+    df_aux = query.backend().rollup(date_limit, selections, ['Order_Date'], path)[['orders']].reset_index()
+    bucket, starts, orders = resample(df_aux['Order_Date'], df_aux['orders'].to_numpy(), min_bucket='week')
+
+    return bucket_frame(bucket, starts, orders, 'ID')
+
+
+@report('riders_by_week')
+def riders_by_week(date_limit, selections, path=DATASET_PATH):
+    # entregadores únicos por semana (ou período maior), a partir do rollup
+    # diário por entregador
+    riders = query.backend().riders(date_limit, selections, path)
+    bucket, starts, counts = count_unique(riders['Order_Date'], riders['Delivery_person_ID'],
+                                          min_bucket='week')
+
+    return bucket_frame(bucket, starts, counts, 'order_by_deliver')
+
+
+# ---------------------------------------
+# Visão entregadores
+# ---------------------------------------
+@report('ratings_by_rider')
+def ratings_by_rider(date_limit, selections, path=DATASET_PATH):
+    riders = query.backend().riders(date_limit, selections, path)
+    df_aux = (riders.loc[:, ['Delivery_person_ID', 'ratings_sum', 'ratings_n']]
+                    .groupby('Delivery_person_ID', observed=True)
+                    .sum()
+                    .sort_index())
+    df_aux['Delivery_person_Ratings'] = df_aux['ratings_sum'] / df_aux['ratings_n']
+
+    return df_aux[['Delivery_person_Ratings']].reset_index()
+
+
+def _ratings_by(date_limit, selections, path, dimension):
+    df_aux = query.backend().rollup(date_limit, selections, [dimension], path)[['ratings_mean', 'ratings_std']]
+    df_aux.columns = ['delivery_mean', 'delivery_std']
+
+    return df_aux.reset_index()
+
+
+@report('ratings_by_traffic')
+def ratings_by_traffic(date_limit, selections, path=DATASET_PATH):
+    return _ratings_by(date_limit, selections, path, 'Road_traffic_density')
+
+
+@report('ratings_by_weather')
+def ratings_by_weather(date_limit, selections, path=DATASET_PATH):
+    return _ratings_by(date_limit, selections, path, 'Weatherconditions')
+
+
+@report('rider_ranking')
+def rider_ranking(date_limit, selections, path=DATASET_PATH):
+    # Os 10 entregadores mais rápidos e os 10 mais lentos de cada cidade,
+    # calculados juntos; a coluna ranking diz a qual tabela a linha pertence
+    fastest, slowest = rank_riders(query.backend().riders(date_limit, selections, path), k=10)
+
+    return pd.concat([fastest.assign(ranking='fastest'), slowest.assign(ranking='slowest')],
+                     ignore_index=True)
+
+
+# ---------------------------------------
+# Visão restaurantes
+# ---------------------------------------
+def _time_by(date_limit, selections, path, dimensions):
+    df_aux = query.backend().rollup(date_limit, selections, dimensions, path)[['time_mean', 'time_std']]
+    df_aux.columns = ['avg_time', 'std_time']
+
+    return df_aux.reset_index()
+
+
+@report('time_by_city')
+def time_by_city(date_limit, selections, path=DATASET_PATH):
+    return _time_by(date_limit, selections, path, ['City'])
+
+
+@report('time_by_city_traffic')
+def time_by_city_traffic(date_limit, selections, path=DATASET_PATH):
+    return _time_by(date_limit, selections, path, ['City', 'Road_traffic_density'])
+
+
+@report('time_by_city_order_type')
+def time_by_city_order_type(date_limit, selections, path=DATASET_PATH):
+    return _time_by(date_limit, selections, path, ['City', 'Type_of_order'])
+
+
+@report('distance_by_city')
+def distance_by_city(date_limit, selections, path=DATASET_PATH):
+    return (query.backend().rollup(date_limit, selections, ['City'], path)[['distance_mean']]
+              .rename(columns={'distance_mean': 'distance'})
+              .reset_index())
+
+
+# ---------------------------------------
+# Pré-cálculo
+# ---------------------------------------
+def precompute(date_limits, selections_list, path=DATASET_PATH, fmt='parquet'):
+    """ Calcula todos os relatórios para as datas e filtros e os grava.
+
+        Combinações que selecionam os mesmos dados (mesmo estado
+        normalizado) são calculadas uma vez só.
+
+        Imput: lista de datas limite, lista de dicionários coluna ->
+               rótulos, caminho do csv, formato ('parquet' ou 'json')
+        Output: (diretório dos relatórios, quantidade de estados)
+    """
+    signature = source_signature(path)
+    days, labels = _dataset_space(path)
+
+    reports = {}
+    for date_limit in date_limits:
+        for selections in selections_list:
+            state = normalized_state(date_limit, selections, path)
+            if state not in reports:
+                reports[state] = {name: func(date_limit, selections, path)
+                                  for name, func in REPORTS.items()}
+
+    directory = store.write_store(path, signature, days, labels, reports, fmt)
+
+    return directory, len(reports)
+
+
+def _dataset_space(path):
+    # dias (iso) e rótulos dos filtros do dataset atual
+    days, labels = state_space(path)
+
+    return [pd.Timestamp(day).date().isoformat() for day in days], labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pré-calcula os relatórios do dashboard.')
+    parser.add_argument('--source', default=DATASET_PATH, help='caminho do csv')
+    parser.add_argument('--dates', nargs='+', type=datetime.date.fromisoformat,
+                        help='datas limite (padrão: cada dia do dataset e o dia seguinte ao último)')
+    parser.add_argument('--traffic', nargs='+', default=['Low,Medium,High,Jam'],
+                        help='condições de trânsito selecionadas, separadas por vírgula')
+    parser.add_argument('--format', choices=sorted(store.FORMATS), default='parquet')
+    args = parser.parse_args(argv)
+
+    date_limits = args.dates
+    if date_limits is None:
+        days, _ = _dataset_space(args.source)
+        date_limits = [datetime.date.fromisoformat(day) for day in days]
+        if date_limits:
+            date_limits.append(date_limits[-1] + datetime.timedelta(days=1))
+    date_limits = [datetime.datetime.combine(date, datetime.time()) for date in date_limits]
+
+    selections_list = [{'Road_traffic_density': traffic.split(',')} for traffic in args.traffic]
+
+    directory, states = precompute(date_limits, selections_list, args.source, args.format)
+    print('{} estados x {} relatórios gravados em {}'.format(states, len(REPORTS), directory))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+""" Agregado diário por entregador.
+
+    Cada linha soma os pedidos de um entregador em um dia e em uma combinação
+    das colunas filtráveis da barra lateral (ver filters.FILTER_COLUMNS), de
+    modo que qualquer filtro aceito pelo motor de filtros vale também para o
+    rollup. Todas as colunas são somas, mínimos ou máximos, então
+    agregados de partes diferentes do csv podem ser juntados sem voltar aos
+    pedidos (ver merge_rider_rollups). Dele saem os entregadores únicos, as
+    avaliações médias por entregador, os rankings de velocidade e os
+    extremos de idade e de condição do veículo.
+"""
+# libraries
+from currycompany.cube import replace_days
+from currycompany.data import DATASET_PATH, load_derived
+from currycompany.filters import FILTER_COLUMNS
+from currycompany.schema import concat_frames
+
+RIDER_FILTER_COLUMNS = FILTER_COLUMNS
+
+RIDER_KEYS = ['Order_Date', 'Delivery_person_ID'] + RIDER_FILTER_COLUMNS
+
+# coluna do rollup -> forma de juntar dois rollups
+RIDER_MERGE = {
+    'orders': 'sum',
+    'ratings_n': 'sum',
+    'ratings_sum': 'sum',
+    'time_sum': 'sum',
+    'age_min': 'min',
+    'age_max': 'max',
+    'vehicle_min': 'min',
+    'vehicle_max': 'max',
+    'latitude_sum': 'sum',
+    'longitude_sum': 'sum',
+    'location_n': 'sum',
+}
+
+
+def build_rider_rollup(df):
+    """ Agrega o dataframe limpo por dia, entregador e colunas filtráveis.
+
+        Imput: dataframe limpo
+        Output: dataframe com RIDER_KEYS e as colunas de RIDER_MERGE
+    """
+    riders = (df.groupby(RIDER_KEYS, sort=True, dropna=False, observed=True)
+                .agg(orders=('ID', 'size'),
+                     ratings_n=('Delivery_person_Ratings', 'count'),
+                     ratings_sum=('Delivery_person_Ratings', 'sum'),
+                     time_sum=('Time_taken(min)', 'sum'),
+                     age_min=('Delivery_person_Age', 'min'),
+                     age_max=('Delivery_person_Age', 'max'),
+                     vehicle_min=('Vehicle_condition', 'min'),
+                     vehicle_max=('Vehicle_condition', 'max'),
+                     latitude_sum=('Delivery_location_latitude', 'sum'),
+                     longitude_sum=('Delivery_location_longitude', 'sum'),
+                     location_n=('Delivery_location_latitude', 'count'))
+                .sort_index()
+                .reset_index())
+
+    return riders
+
+
+def merge_rider_rollups(rollups):
+    """ Junta rollups de partes diferentes do dataset em um só.
+
+        Imput: lista de rollups (ver build_rider_rollup)
+        Output: rollup equivalente ao do dataset inteiro
+    """
+    return (concat_frames(rollups)
+              .groupby(RIDER_KEYS, sort=True, dropna=False, observed=True)
+              .agg(RIDER_MERGE)
+              .sort_index()
+              .reset_index())
+
+
+def update_riders(riders, new_rows, df):
+    """ Atualiza o rollup com as linhas novas do csv (ver data.load_derived). """
+    return replace_days(riders, build_rider_rollup(new_rows), merge_rider_rollups)
+
+
+def load_riders(path=DATASET_PATH):
+    """ Rollup por entregador da versão atual do dataset. """
+    return load_derived('riders', build_rider_rollup, path, updater=update_riders)
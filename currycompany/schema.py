@@ -0,0 +1,134 @@
+""" Esquema compacto do dataset limpo e relatório de memória.
+
+    Depois da limpeza, os textos de poucos valores distintos viram
+    categóricos (sem os espaços do csv), os contadores viram inteiros de 8 ou
+    16 bits e as coordenadas viram float32. As métricas usadas nas médias e
+    desvios (avaliações, tempo, distância) mantêm a precisão necessária para
+    as somas do cubo.
+
+    Uso do relatório:
+        python -m currycompany.schema [--source dataset/train.csv]
+"""
+# libraries
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Textos com poucos valores distintos. ID é único por pedido e continua texto
+CATEGORY_COLUMNS = ['Delivery_person_ID', 'Time_Orderd', 'Time_Order_picked',
+                    'Weatherconditions', 'Road_traffic_density', 'Type_of_order',
+                    'Type_of_vehicle', 'Festival', 'City']
+
+# Tipos numéricos estreitos. Idade, condição do veículo e entregas múltiplas
+# ficam bem abaixo de 127 e o tempo de entrega abaixo de 32767 minutos; as
+# coordenadas em float32 têm erro abaixo de 1 metro
+NARROW_DTYPES = {
+    'Delivery_person_Age': 'int8',
+    'Vehicle_condition': 'int8',
+    'multiple_deliveries': 'int8',
+    'Time_taken(min)': 'int16',
+    'Restaurant_latitude': 'float32',
+    'Restaurant_longitude': 'float32',
+    'Delivery_location_latitude': 'float32',
+    'Delivery_location_longitude': 'float32',
+}
+
+
+def stripped_categorical(values):
+    """ Converte uma coluna de texto em categórico, sem espaços nas pontas.
+
+        O strip roda só sobre os valores distintos; rótulos que ficam iguais
+        depois do strip ('Low' e 'Low ') viram a mesma categoria. As
+        categorias ficam em ordem alfabética.
+
+        Imput: series de texto (ou já categórica)
+        Output: pd.Categorical
+    """
+    codes, uniques = pd.factorize(values)
+    labels = pd.Index(np.asarray(uniques, dtype=object)).str.strip()
+    categories = pd.Index(sorted(set(labels)))
+
+    # o código -1 (ausente) aponta para a última posição, que continua -1
+    lookup = np.append(categories.get_indexer(labels), -1)
+
+    return pd.Categorical.from_codes(lookup[codes], categories=categories)
+
+
+def compact_schema(df):
+    """ Converte o dataframe limpo para o esquema compacto.
+
+        Imput: dataframe limpo (ver data.prepare_dataset)
+        Output: o mesmo dataframe com os tipos de CATEGORY_COLUMNS e
+                NARROW_DTYPES
+    """
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = stripped_categorical(df[col])
+
+    narrow = {col: dtype for col, dtype in NARROW_DTYPES.items() if col in df.columns}
+
+    return df.astype(narrow, copy=False)
+
+
+def concat_frames(frames):
+    """ pd.concat que mantém as colunas categóricas.
+
+        Partes lidas separadamente (blocos do csv, linhas novas) têm
+        categorias diferentes e o pd.concat as converteria em texto. Aqui as
+        categorias são unidas (em ordem alfabética) antes da junção.
+
+        Imput: lista de dataframes com as mesmas colunas
+        Output: dataframe com as linhas de todos, índice 0..n-1
+    """
+    frames = [frame for frame in frames]
+    for col in frames[0].columns:
+        dtypes = [frame[col].dtype for frame in frames]
+        if not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+
+        categories = pd.Index(sorted(set().union(*(dtype.categories for dtype in dtypes))))
+        frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)})
+                  if not frame[col].cat.categories.equals(categories) else frame
+                  for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(before, after):
+    """ Bytes ocupados por coluna antes e depois da compactação.
+
+        Imput: dataframe no esquema original e no esquema compacto
+        Output: dataframe por coluna com dtypes, bytes e redução, e uma
+                linha TOTAL
+    """
+    report = pd.DataFrame({
+        'dtype_antes': before.dtypes.astype(str),
+        'bytes_antes': before.memory_usage(index=False, deep=True),
+        'dtype_depois': after.dtypes.astype(str),
+        'bytes_depois': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['TOTAL'] = ['', report['bytes_antes'].sum(), '', report['bytes_depois'].sum()]
+    report['reducao'] = 1 - report['bytes_depois'] / report['bytes_antes']
+
+    return report
+
+
+def main(argv=None):
+    """ Imprime o relatório de memória do csv informado. """
+    # import aqui para evitar import circular (data usa este módulo)
+    from currycompany.data import DATASET_PATH, clean_code, derive_columns, read_raw
+
+    parser = argparse.ArgumentParser(description='Relatório de memória do esquema compacto.')
+    parser.add_argument('--source', default=DATASET_PATH, help='caminho do csv')
+    args = parser.parse_args(argv)
+
+    before = derive_columns(clean_code(read_raw(args.source)))
+    after = compact_schema(before.copy())
+
+    with pd.option_context('display.width', 120, 'display.max_columns', 10):
+        print(memory_report(before, after))
+
+
+if __name__ == '__main__':
+    main()
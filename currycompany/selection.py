@@ -0,0 +1,314 @@
+""" Aplica o estado da barra lateral (data limite e filtros) aos dados.
+
+    O filtro de data é um prefixo das estruturas ordenadas por data (ver
+    dateindex) e os demais filtros viram uma única máscara sobre esse
+    prefixo (ver filters). Cada seleção faz no máximo uma cópia de linhas,
+    não importa quantos filtros estejam ativos.
+
+    As páginas são desenhadas a partir do cubo de métricas e do rollup por
+    entregador. No modo 'memory' eles são construídos a partir do dataset
+    em memória; no modo 'stream' vêm da ingestão em blocos, sem o dataframe
+    de pedidos (ver config).
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+from currycompany import config, sqlbackend, store
+from currycompany.cube import kept_rows, load_cube, rollup
+from currycompany.data import DATASET_PATH, load_dataset, load_derived, source_signature
+from currycompany.dateindex import load_date_index
+from currycompany.filters import FilterIndex
+from currycompany.instrument import timed
+from currycompany.riders import RIDER_FILTER_COLUMNS, load_riders
+from currycompany.spatial import GRID_FILTER_COLUMNS, load_spatial_index, order_cells
+from currycompany.streaming import load_stream_aggregates, scan_grid_cells
+
+
+def streaming():
+    """ True quando os dados vêm da ingestão em blocos. """
+    return config.INGEST_MODE == 'stream'
+
+
+def _extend_filter_index(index, frame, new_rows):
+    """ Índice de filtros de frame depois das linhas novas do csv.
+
+        O dataset, o cubo e o rollup continuam ordenados por data depois das
+        linhas novas (ordenação estável, ver data._append_tail e
+        cube.replace_days), então as linhas anteriores ao primeiro dia novo
+        não mudam de posição: só as demais são codificadas.
+    """
+    keep = kept_rows(frame, new_rows)
+
+    return index.extended(keep, frame.iloc[keep:])
+
+
+def load_filter_index(path=DATASET_PATH):
+    """ Códigos das colunas filtráveis do dataset. """
+    return load_derived('filter_index', FilterIndex, path,
+                        updater=lambda index, new_rows, df: _extend_filter_index(index, df, new_rows))
+
+
+def load_cube_filter_index(path=DATASET_PATH):
+    """ Códigos das colunas filtráveis do cubo de métricas. """
+    return load_derived('cube_filter_index', lambda df: FilterIndex(load_cube(path)), path,
+                        updater=lambda index, new_rows, df: _extend_filter_index(
+                            index, load_cube(path), new_rows))
+
+
+def load_rider_filter_index(path=DATASET_PATH):
+    """ Códigos das colunas filtráveis do rollup por entregador. """
+    return load_derived('rider_filter_index',
+                        lambda df: FilterIndex(load_riders(path), RIDER_FILTER_COLUMNS), path,
+                        updater=lambda index, new_rows, df: _extend_filter_index(
+                            index, load_riders(path), new_rows))
+
+
+def state_space(path=DATASET_PATH):
+    """ Dias do dataset e rótulos dos filtros, usados para normalizar estados.
+
+        Vêm do manifest dos relatórios pré-calculados quando ele é desta
+        versão do csv (sem carregar o dataset), do arquivo SQLite com o
+        backend 'sqlite' (ver query), ou dos índices de datas e de filtros
+        do cubo.
+    """
+    manifest = store.load_manifest(path, source_signature(path))
+    if manifest is not None:
+        return np.array(manifest['days'], dtype='datetime64[ns]'), manifest['labels']
+
+    if config.QUERY_BACKEND == 'sqlite':
+        return sqlbackend.state_space(path)
+
+    if streaming():
+        aggregates = load_stream_aggregates(path)
+        date_index, filter_index = aggregates.date_index, aggregates.cube_filter_index
+    else:
+        date_index, filter_index = load_date_index(path), load_cube_filter_index(path)
+
+    return date_index.days, {col: codes.labels for col, codes in filter_index.columns.items()}
+
+
+def normalized_state(date_limit, selections, path=DATASET_PATH):
+    """ Estado da barra lateral reduzido ao que muda os dados selecionados.
+
+        A data vira o último dia do dataset anterior a ela e só os filtros
+        que realmente descartam algum rótulo entram, com os rótulos
+        existentes ordenados. Estados que selecionam os mesmos dados têm o
+        mesmo estado normalizado.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: tupla (dia iso ou None, ((coluna, rótulos), ...))
+    """
+    days, labels = state_space(path)
+
+    position = int(np.searchsorted(days, np.datetime64(pd.Timestamp(date_limit), 'ns'), side='left'))
+    last_day = pd.Timestamp(days[position - 1]).date().isoformat() if position else None
+
+    filters = []
+    for col, selected in sorted(selections.items()):
+        if selected is None:
+            continue
+        chosen = {str(label).strip() for label in selected}
+        kept = tuple(sorted(label for label in labels[col] if label in chosen))
+        if len(kept) < len(labels[col]):
+            filters.append((col, kept))
+
+    return (last_day, tuple(filters))
+
+
+def state_key(date_limit, selections, path=DATASET_PATH):
+    """ Chave normalizada do estado da barra lateral, para caches.
+
+        É o estado normalizado (ver normalized_state) mais a versão do csv e
+        o modo de ingestão.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: tupla imutável
+    """
+    return (config.INGEST_MODE, source_signature(path), normalized_state(date_limit, selections, path))
+
+
+def _apply(df, stop, mask):
+    if mask is None:
+        return df.iloc[:stop]
+
+    return df.take(np.flatnonzero(mask))
+
+
+def _select(df, filter_index, date_limit, selections):
+    stop = df['Order_Date'].searchsorted(pd.Timestamp(date_limit), side='left')
+
+    return _apply(df, stop, filter_index.mask(selections, stop))
+
+
+@timed('select_rows')
+def select_rows(date_limit, selections, path=DATASET_PATH):
+    """ Pedidos anteriores à data limite que passam por todos os filtros.
+
+        Sem filtros ativos o resultado é um prefixo sem cópia do dataset
+        compartilhado; em ambos os casos deve ser tratado como somente
+        leitura. Não disponível no modo 'stream'.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: dataframe com as linhas selecionadas
+    """
+    if streaming():
+        raise RuntimeError('os pedidos não ficam em memória no modo stream')
+
+    stop = load_date_index(path).row_position(date_limit)
+    mask = load_filter_index(path).mask(selections, stop)
+
+    return _apply(load_dataset(path), stop, mask)
+
+
+@timed('select_cells')
+def select_cells(date_limit, selections, path=DATASET_PATH):
+    """ Células do cubo anteriores à data limite que passam pelos filtros.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: cubo filtrado
+    """
+    if streaming():
+        aggregates = load_stream_aggregates(path)
+        return _select(aggregates.cube, aggregates.cube_filter_index, date_limit, selections)
+
+    return _select(load_cube(path), load_cube_filter_index(path), date_limit, selections)
+
+
+@timed('select_riders')
+def select_riders(date_limit, selections, path=DATASET_PATH):
+    """ Linhas do rollup por entregador anteriores à data limite e filtradas.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: rollup por entregador filtrado
+    """
+    if streaming():
+        aggregates = load_stream_aggregates(path)
+        return _select(aggregates.riders, aggregates.rider_filter_index, date_limit, selections)
+
+    return _select(load_riders(path), load_rider_filter_index(path), date_limit, selections)
+
+
+@timed('daily_orders')
+def daily_orders(date_limit, selections, path=DATASET_PATH):
+    """ Pedidos por dia para o gráfico de datas.
+
+        Sem filtros ativos (e com o dataset em memória) as contagens vêm
+        direto do índice de datas; nos outros casos, da soma das células do
+        cubo.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: dataframe com as colunas order_date e qtde_entregas
+    """
+    if not streaming() and not load_cube_filter_index(path).active(selections):
+        return load_date_index(path).daily_counts(date_limit)
+
+    df_aux = rollup(select_cells(date_limit, selections, path), ['Order_Date'])[['orders']].reset_index()
+    df_aux.columns = ['order_date', 'qtde_entregas']
+
+    return df_aux
+
+
+def _located_riders(date_limit, selections, path=DATASET_PATH):
+    # rollup por entregador para os mapas quando os pedidos não ficam em
+    # memória: do arquivo SQLite com o backend 'sqlite', senão da ingestão
+    # em blocos
+    if config.QUERY_BACKEND == 'sqlite':
+        return sqlbackend.riders(normalized_state(date_limit, selections, path), path)
+
+    return select_riders(date_limit, selections, path)
+
+
+def _orders_in_memory():
+    return not streaming() and config.QUERY_BACKEND != 'sqlite'
+
+
+@timed('map_locations')
+def map_locations(date_limit, selections, path=DATASET_PATH):
+    """ Localização central das entregas por cidade e trânsito, para o mapa.
+
+        Com o dataset em memória é a mediana das coordenadas de entrega. No
+        modo 'stream' e com o backend 'sqlite' os pedidos não ficam em
+        memória, então é usada a média, calculada a partir das somas do
+        rollup por entregador (só sobre os pedidos com coordenadas válidas,
+        ver location_n).
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: dataframe com City, Road_traffic_density e as coordenadas
+    """
+    cols = ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']
+
+    if _orders_in_memory():
+        df1 = select_rows(date_limit, selections, path)
+        return df1.loc[:, cols].groupby(['City', 'Road_traffic_density'], observed=True).median().sort_index().reset_index()
+
+    sums = (_located_riders(date_limit, selections, path)
+              .groupby(['City', 'Road_traffic_density'], observed=True)[['location_n', 'latitude_sum', 'longitude_sum']]
+              .sum()
+              .sort_index())
+    df_aux = pd.DataFrame({'Delivery_location_latitude': sums['latitude_sum'] / sums['location_n'],
+                           'Delivery_location_longitude': sums['longitude_sum'] / sums['location_n']})
+
+    return df_aux.reset_index()[cols]
+
+
+@timed('map_points')
+def map_points(date_limit, selections, path=DATASET_PATH):
+    """ Coordenadas de entrega de cada pedido, para os mapas por pedido.
+
+        Com o dataset em memória há um ponto por pedido (peso 1). No modo
+        'stream' e com o backend 'sqlite' os pedidos não ficam em memória,
+        então cada ponto é a localização média de uma linha do rollup por
+        entregador, com peso igual ao número de pedidos. Pedidos sem
+        coordenadas válidas ficam de fora.
+
+        Imput: data limite, dicionário coluna -> rótulos, caminho do csv
+        Output: array float64 (n, 3) com latitude, longitude e peso
+    """
+    if _orders_in_memory():
+        df1 = select_rows(date_limit, selections, path)
+        points = np.column_stack([df1['Delivery_location_latitude'].to_numpy(dtype='float64'),
+                                  df1['Delivery_location_longitude'].to_numpy(dtype='float64'),
+                                  np.ones(len(df1))])
+        return points[np.isfinite(points[:, 0])]
+
+    riders = _located_riders(date_limit, selections, path)
+    riders = riders[riders['location_n'].to_numpy() > 0]
+    located = riders['location_n'].to_numpy(dtype='float64')
+
+    return np.column_stack([riders['latitude_sum'].to_numpy() / located,
+                            riders['longitude_sum'].to_numpy() / located,
+                            located])
+
+
+@timed('grid_cells')
+def grid_cells(date_limit, selections, point='delivery', bbox=None, path=DATASET_PATH):
+    """ Pedidos e tempo médio de entrega por célula da grade espacial.
+
+        Nos dois modos de ingestão a resposta sai do índice espacial (ver
+        spatial), sem passar pelos pedidos; com um retângulo só as células em
+        vista são lidas. O índice só guarda os filtros da barra lateral: com
+        outro filtro ativo os pedidos selecionados são percorridos (no modo
+        'stream', lendo o csv em blocos). Com o backend 'sqlite' é um GROUP
+        BY sobre o arquivo (ver sqlbackend.grid_cells).
+
+        Imput: data limite, dicionário coluna -> rótulos, ponto ('delivery' ou
+               'restaurant'), retângulo (sul, oeste, norte, leste) ou None,
+               caminho do csv
+        Output: dataframe com cell, latitude, longitude, orders e time_mean
+    """
+    state = normalized_state(date_limit, selections, path)
+    if config.QUERY_BACKEND == 'sqlite':
+        return sqlbackend.grid_cells(state, point, bbox, path)
+
+    if any(col not in GRID_FILTER_COLUMNS for col, labels in state[1]):
+        if streaming():
+            return scan_grid_cells(date_limit, selections, point, bbox, path)
+        return order_cells(select_rows(date_limit, selections, path), point, bbox)
+
+    if streaming():
+        index = load_stream_aggregates(path).spatial[point]
+    else:
+        index = load_spatial_index(point, path)
+
+    return index.cells(date_limit, selections, bbox)
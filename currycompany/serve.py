@@ -0,0 +1,30 @@
+""" Inicia o aquecimento (ver warmup) e o servidor do Streamlit no mesmo processo.
+
+    Uso (na raiz do repositório):
+        python -m currycompany.serve
+        python -m currycompany.serve --server.port 8080
+
+    Os argumentos são repassados ao streamlit run Home.py. Com streamlit run
+    o aquecimento só começa quando a primeira página é aberta; aqui ele
+    começa junto com o servidor, antes do primeiro visitante.
+"""
+# libraries
+import os
+import sys
+
+from currycompany.warmup import ensure_warmup
+
+HOME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Home.py')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    ensure_warmup()
+
+    from streamlit.web import cli
+    cli.main(prog_name='streamlit', args=['run', HOME] + list(argv))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+""" Snapshot colunar (Arrow/Feather) do dataset limpo.
+
+    O snapshot fica ao lado do csv (dataset/train.feather), sem compressão,
+    para que possa ser lido via memory-map. A assinatura do csv de origem
+    (mtime e tamanho) é gravada nos metadados do arquivo e usada para saber
+    se o snapshot está desatualizado.
+
+    Reconstruir o snapshot manualmente:
+
+        python -m currycompany.snapshot
+        python -m currycompany.snapshot --check
+"""
+# libraries
+import argparse
+import json
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+from currycompany.instrument import timed
+
+# Aumentar sempre que a saída do prepare_dataset mudar, para invalidar
+# snapshots gravados por versões anteriores
+SNAPSHOT_VERSION = 5
+
+_METADATA_KEY = b'currycompany.source'
+
+
+def snapshot_path(source):
+    """ Caminho do snapshot correspondente a um csv (mesmo nome, .feather). """
+    return os.path.splitext(source)[0] + '.feather'
+
+
+def _source_metadata(signature):
+    _, mtime_ns, size = signature
+    return {'version': SNAPSHOT_VERSION, 'mtime_ns': mtime_ns, 'size': size}
+
+
+@timed('snapshot_write')
+def write_snapshot(df, source, signature):
+    """ Grava o dataframe limpo como snapshot Feather do csv de origem.
+
+        A escrita é feita em um arquivo temporário e depois renomeada, para
+        que um leitor concorrente nunca veja um snapshot pela metade.
+
+        Imput: dataframe limpo, caminho do csv, assinatura do csv
+        Output: caminho do snapshot
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[_METADATA_KEY] = json.dumps(_source_metadata(signature)).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    target = snapshot_path(source)
+    tmp = target + '.tmp'
+    feather.write_feather(table, tmp, compression='uncompressed')
+    os.replace(tmp, target)
+
+    return target
+
+
+def snapshot_is_fresh(source, signature):
+    """ Verifica se o snapshot existe e foi gerado a partir do csv atual.
+
+        Só o schema do arquivo é lido, então a verificação é barata.
+
+        Imput: caminho do csv, assinatura atual do csv
+        Output: True se o snapshot pode ser usado
+    """
+    target = snapshot_path(source)
+    if not os.path.exists(target):
+        return False
+
+    try:
+        with pa.memory_map(target) as f:
+            metadata = ipc.open_file(f).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+
+    raw = metadata.get(_METADATA_KEY)
+    if raw is None:
+        return False
+
+    return json.loads(raw) == _source_metadata(signature)
+
+
+@timed('snapshot_read')
+def read_snapshot(source):
+    """ Lê o snapshot via memory-map e devolve o dataframe limpo.
+
+        Com split_blocks as colunas numéricas e de data não são consolidadas
+        em blocos novos, evitando cópias desnecessárias.
+    """
+    table = feather.read_table(snapshot_path(source), memory_map=True)
+
+    return table.to_pandas(split_blocks=True)
+
+
+def main(argv=None):
+    # Importado aqui para evitar import circular com currycompany.data
+    from currycompany.data import DATASET_PATH, rebuild_snapshot, source_signature
+
+    parser = argparse.ArgumentParser(
+        prog='python -m currycompany.snapshot',
+        description='Reconstrói o snapshot Feather do dataset limpo.')
+    parser.add_argument('--source', default=DATASET_PATH, help='csv de origem')
+    parser.add_argument('--check', action='store_true',
+                        help='apenas verifica se o snapshot está atualizado')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        fresh = snapshot_is_fresh(args.source, source_signature(args.source))
+        print('{}: {}'.format(snapshot_path(args.source), 'atualizado' if fresh else 'desatualizado'))
+        return 0 if fresh else 1
+
+    target = rebuild_snapshot(args.source)
+    print('snapshot gravado em {}'.format(target))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+""" Índice espacial em grade fixa sobre as coordenadas de entrega e dos restaurantes.
+
+    O plano é dividido em células de GRID_DEGREES graus de lado (ver config).
+    Cada célula recebe uma chave inteira, linha * grid_columns() + coluna, de
+    modo que as células de uma mesma linha da grade são chaves consecutivas.
+
+    A grade soma os pedidos e os tempos de entrega por filtro da barra
+    lateral (ver filters.SIDEBAR_COLUMNS), célula e dia. O SpatialIndex
+    guarda, para cada rótulo desses filtros, as linhas ordenadas por célula
+    e dia com as somas acumuladas: a data limite vira uma busca binária por
+    célula, e um retângulo uma busca binária por linha da grade. Uma
+    consulta lê só as células em vista, sem passar pelos pedidos nem pelos
+    dias. Linhas novas do csv são intercaladas nas linhas já ordenadas (ver
+    SpatialIndex.merged).
+
+    Os demais filtros não ficam na grade; com algum deles ativo a consulta
+    percorre os pedidos selecionados (ver order_cells e
+    selection.grid_cells).
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+from currycompany import config
+from currycompany.data import DATASET_PATH, load_derived
+from currycompany.filters import SIDEBAR_COLUMNS
+
+# ponto -> colunas de latitude e longitude
+POINTS = {
+    'delivery': ('Delivery_location_latitude', 'Delivery_location_longitude'),
+    'restaurant': ('Restaurant_latitude', 'Restaurant_longitude'),
+}
+
+GRID_FILTER_COLUMNS = SIDEBAR_COLUMNS
+
+GRID_KEYS = GRID_FILTER_COLUMNS + ['cell', 'Order_Date']
+
+GRID_VALUES = ['orders', 'time_sum']
+
+# Chave de uma linha do índice: célula * DAY_SLOTS + dia (dias desde
+# 1970-01-01 somados a DAY_BIAS), crescente por célula e por dia
+DAY_SLOTS = 2 ** 20
+DAY_BIAS = 2 ** 19
+
+
+def grid_columns(degrees=None):
+    """ Quantidade de colunas da grade (longitudes de -180 a 180). """
+    degrees = config.GRID_DEGREES if degrees is None else degrees
+
+    return int(np.ceil(360 / degrees)) + 1
+
+
+def cell_position(latitude, longitude, degrees=None):
+    """ Linha e coluna da grade de cada coordenada.
+
+        Imput: arrays de latitude e longitude, lado da célula em graus
+        Output: arrays float64 de linha e coluna (NaN para coordenadas ausentes)
+    """
+    degrees = config.GRID_DEGREES if degrees is None else degrees
+
+    return (np.floor((np.asarray(latitude, dtype='float64') + 90) / degrees),
+            np.floor((np.asarray(longitude, dtype='float64') + 180) / degrees))
+
+
+def cell_keys(latitude, longitude, degrees=None):
+    """ Chave da célula de cada coordenada.
+
+        Imput: arrays de latitude e longitude, lado da célula em graus
+        Output: array int64 de chaves (-1 para coordenadas ausentes)
+    """
+    row, col = cell_position(latitude, longitude, degrees)
+    keys = row * grid_columns(degrees) + col
+
+    return np.where(np.isfinite(keys), keys, -1).astype('int64')
+
+
+def cell_corners(keys, degrees=None):
+    """ Canto sudoeste (latitude, longitude) de cada célula.
+
+        Imput: array de chaves, lado da célula em graus
+        Output: arrays float64 de latitude e longitude
+    """
+    degrees = config.GRID_DEGREES if degrees is None else degrees
+    row, col = np.divmod(np.asarray(keys, dtype='int64'), grid_columns(degrees))
+
+    return row * degrees - 90, col * degrees - 180
+
+
+def in_bbox(keys, bbox, degrees=None):
+    """ Máscara das células dentro do retângulo (sul, oeste, norte, leste). """
+    (row_start, row_stop), (col_start, col_stop) = cell_position(
+        [bbox[0], bbox[2]], [bbox[1], bbox[3]], degrees)
+    row, col = np.divmod(np.asarray(keys, dtype='int64'), grid_columns(degrees))
+
+    return (row >= row_start) & (row <= row_stop) & (col >= col_start) & (col <= col_stop)
+
+
+def sum_cells(cells, orders, time_sum):
+    """ Junta as somas de chaves repetidas.
+
+        Imput: arrays de chaves, pedidos e soma dos tempos
+        Output: chaves crescentes e distintas, pedidos e soma dos tempos
+    """
+    cells, inverse = np.unique(cells, return_inverse=True)
+
+    return (cells, np.bincount(inverse, orders, len(cells)).astype('int64'),
+            np.bincount(inverse, time_sum, len(cells)))
+
+
+def cell_frame(cells, orders, time_sum, degrees=None):
+    """ Resultado de uma consulta à grade: uma linha por célula.
+
+        Imput: arrays de chaves (crescentes), pedidos e soma dos tempos de
+               cada célula, lado da célula em graus
+        Output: dataframe com cell, latitude e longitude (canto sudoeste),
+                orders e time_mean
+    """
+    latitude, longitude = cell_corners(cells, degrees)
+    orders = np.asarray(orders, dtype='int64')
+
+    return pd.DataFrame({'cell': np.asarray(cells, dtype='int64'),
+                         'latitude': latitude,
+                         'longitude': longitude,
+                         'orders': orders,
+                         'time_mean': np.asarray(time_sum, dtype='float64') / np.maximum(orders, 1)})
+
+
+def order_sums(df, point='delivery', bbox=None, degrees=None):
+    """ Pedidos e soma dos tempos por célula, direto das linhas de pedidos.
+
+        Imput: dataframe limpo (já selecionado), ponto, retângulo ou None,
+               lado da célula em graus
+        Output: chaves crescentes, pedidos e soma dos tempos (ver sum_cells)
+    """
+    latitude, longitude = POINTS[point]
+    keys = cell_keys(df[latitude], df[longitude], degrees)
+    keep = keys >= 0
+    if bbox is not None:
+        keep &= in_bbox(keys, bbox, degrees)
+
+    return sum_cells(keys[keep], np.ones(int(keep.sum())),
+                     df['Time_taken(min)'].to_numpy(dtype='float64')[keep])
+
+
+def order_cells(df, point='delivery', bbox=None, degrees=None):
+    """ Mesmo resultado de SpatialIndex.cells, percorrendo os pedidos.
+
+        Usado quando algum filtro fora de GRID_FILTER_COLUMNS está ativo.
+    """
+    return cell_frame(*order_sums(df, point, bbox, degrees), degrees)
+
+
+def build_grid(df, point='delivery'):
+    """ Agrega o dataframe limpo por filtro da barra lateral, célula e dia.
+
+        Pedidos sem coordenadas válidas (ver geo.clean_coordinates) ficam
+        fora da grade.
+
+        Imput: dataframe limpo, ponto ('delivery' ou 'restaurant')
+        Output: dataframe com GRID_KEYS e GRID_VALUES, ordenado por GRID_KEYS
+    """
+    latitude, longitude = POINTS[point]
+    keys = cell_keys(df[latitude], df[longitude])
+    valid = np.flatnonzero(keys >= 0)
+
+    values = {col: df[col].take(valid) for col in GRID_FILTER_COLUMNS}
+    values['cell'] = keys[valid]
+    values['Order_Date'] = df['Order_Date'].take(valid)
+    values['orders'] = np.ones(len(valid), dtype='int64')
+    values['time_sum'] = df['Time_taken(min)'].to_numpy(dtype='int64')[valid]
+
+    return (pd.DataFrame(values)
+              .groupby(GRID_KEYS, sort=True, dropna=False, observed=True)
+              .sum()
+              .sort_index()
+              .reset_index())
+
+
+class _Layer:
+    """ Linhas da grade de um rótulo dos filtros, ordenadas por célula e dia.
+
+        Atributos:
+            keys: chaves (célula, dia) crescentes (ver DAY_SLOTS)
+            cum_orders, cum_time: somas acumuladas, com um 0 na frente
+            cells: células distintas, crescentes
+            starts: posição da primeira linha de cada célula
+    """
+
+    def __init__(self, keys, orders, time_sum):
+        self.keys = keys
+        self.cum_orders = np.concatenate([[0], np.cumsum(orders, dtype='int64')])
+        self.cum_time = np.concatenate([[0], np.cumsum(time_sum, dtype='int64')])
+
+        cells = keys // DAY_SLOTS
+        self.starts = np.flatnonzero(np.diff(cells, prepend=-1))
+        self.cells = cells[self.starts]
+
+    def merged(self, keys, orders, time_sum):
+        """ Camada com as linhas (chaves crescentes) somadas às existentes.
+
+            As chaves que já existem somam os valores; as demais são
+            inseridas nas suas posições, sem reordenar a camada.
+        """
+        old_orders, old_time = np.diff(self.cum_orders), np.diff(self.cum_time)
+
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        np.add.at(old_orders, positions[found], orders[found])
+        np.add.at(old_time, positions[found], time_sum[found])
+
+        new = ~found
+        return _Layer(np.insert(self.keys, positions[new], keys[new]),
+                      np.insert(old_orders, positions[new], orders[new]),
+                      np.insert(old_time, positions[new], time_sum[new]))
+
+    def cells_in(self, bbox, degrees):
+        """ Índices (em self.cells) das células dentro do retângulo.
+
+            Uma busca binária por linha da grade entre sul e norte: o custo
+            depende das células em vista, e não do tamanho da camada.
+        """
+        if bbox is None:
+            return np.arange(len(self.cells))
+
+        south, west, north, east = bbox
+        (row_start, row_stop), (col_start, col_stop) = cell_position(
+            [south, north], [west, east], degrees)
+
+        rows = np.arange(row_start, row_stop + 1, dtype='int64') * grid_columns(degrees)
+        starts = np.searchsorted(self.cells, rows + int(col_start), side='left')
+        stops = np.searchsorted(self.cells, rows + int(col_stop), side='right')
+
+        # concatena os intervalos [start, stop) de cada linha da grade
+        lengths = stops - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+
+        return offsets + np.arange(lengths.sum())
+
+    def sums(self, day, bbox, degrees):
+        """ Células em vista e as somas dos dias anteriores a day. """
+        chosen = self.cells_in(bbox, degrees)
+        cells = self.cells[chosen]
+        stops = np.searchsorted(self.keys, cells * DAY_SLOTS + (day + DAY_BIAS), side='left')
+        starts = self.starts[chosen]
+
+        return (cells, self.cum_orders[stops] - self.cum_orders[starts],
+                self.cum_time[stops] - self.cum_time[starts])
+
+
+def _day_numbers(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype('int64')
+
+
+class SpatialIndex:
+    """ Grade em camadas por rótulo dos filtros, para consultas por retângulo.
+
+        Atributos:
+            point: 'delivery' ou 'restaurant'
+            degrees: lado das células em graus
+            layers: rótulos de GRID_FILTER_COLUMNS (tupla) -> _Layer
+    """
+
+    def __init__(self, grid=None, point='delivery', degrees=None):
+        self.point = point
+        self.degrees = config.GRID_DEGREES if degrees is None else degrees
+        self.layers = {}
+
+        if grid is not None:
+            self.layers = self.merged(grid).layers
+
+    def merged(self, grid):
+        """ Índice com uma grade parcial (ver build_grid) somada.
+
+            As linhas da grade são intercaladas nas camadas já ordenadas
+            (ver _Layer.merged): o custo é linear, sem reordenar o índice.
+
+            Imput: grade das linhas novas
+            Output: novo SpatialIndex
+        """
+        index = SpatialIndex(None, self.point, self.degrees)
+        index.layers = dict(self.layers)
+        if not len(grid):
+            return index
+
+        groups = grid.groupby(GRID_FILTER_COLUMNS, sort=False, dropna=False, observed=True).indices
+        for labels, rows in groups.items():
+            labels = tuple(str(label).strip() for label in np.atleast_1d(labels))
+            part = grid.take(rows)
+            keys = (part['cell'].to_numpy(dtype='int64') * DAY_SLOTS
+                    + _day_numbers(part['Order_Date'].to_numpy()) + DAY_BIAS)
+            order = np.argsort(keys, kind='stable')
+
+            layer = index.layers.get(labels)
+            if layer is None:
+                layer = _Layer(np.empty(0, dtype='int64'), [], [])
+            index.layers[labels] = layer.merged(keys[order],
+                                                part['orders'].to_numpy(dtype='int64')[order],
+                                                part['time_sum'].to_numpy(dtype='int64')[order])
+
+        return index
+
+    def cells(self, date_limit, selections, bbox=None):
+        """ Pedidos e tempo médio de entrega por célula.
+
+            Só os filtros de GRID_FILTER_COLUMNS são aplicados (ver
+            selection.grid_cells para os demais).
+
+            Imput: data limite, dicionário coluna -> rótulos, retângulo
+                   (sul, oeste, norte, leste) ou None
+            Output: dataframe com cell, latitude e longitude (canto sudoeste),
+                    orders e time_mean, ordenado por célula
+        """
+        # as linhas anteriores à data limite são as dos dias < day
+        day = int(_day_numbers(pd.Timestamp(date_limit).ceil('D').to_datetime64()))
+
+        chosen = {}
+        for col in GRID_FILTER_COLUMNS:
+            if selections.get(col) is not None:
+                chosen[GRID_FILTER_COLUMNS.index(col)] = {str(s).strip() for s in selections[col]}
+
+        parts = [layer.sums(day, bbox, self.degrees) for labels, layer in self.layers.items()
+                 if all(labels[i] in selected for i, selected in chosen.items())]
+        if not parts:
+            return cell_frame([], [], [], self.degrees)
+
+        cells, orders, time_sum = (np.concatenate(values) for values in zip(*parts))
+        if len(parts) > 1:
+            cells, orders, time_sum = sum_cells(cells, orders, time_sum)
+
+        keep = orders > 0
+        return cell_frame(cells[keep], orders[keep], time_sum[keep], self.degrees)
+
+
+def update_spatial_index(index, new_rows, df):
+    """ Atualiza o índice com as linhas novas do csv (ver data.load_derived). """
+    return index.merged(build_grid(new_rows, index.point))
+
+
+def load_spatial_index(point='delivery', path=DATASET_PATH):
+    """ Índice espacial da versão atual do dataset, construído uma vez por processo. """
+    return load_derived('spatial_' + point,
+                        lambda df: SpatialIndex(build_grid(df, point), point),
+                        path, updater=update_spatial_index)
@@ -0,0 +1,459 @@
+""" Backend de consultas sobre um arquivo SQLite construído a partir do csv limpo.
+
+    O arquivo fica ao lado do csv (dataset/train.sqlite) com uma tabela
+    orders (uma linha por pedido limpo, só as colunas usadas nos
+    relatórios) e uma tabela meta com a assinatura do csv de origem, como o
+    snapshot (ver snapshot). Ele é construído lendo o csv em blocos, com a
+    mesma limpeza do modo em memória, então nem a construção nem as
+    consultas precisam do dataframe de pedidos inteiro: históricos maiores
+    que a memória funcionam e cada thread do pool de relatórios (ver
+    parallel) consulta o arquivo pela sua própria conexão.
+
+    A meta também guarda até onde o csv foi lido. Quando o csv só recebe
+    linhas novas no fim, apenas elas são inseridas, pelo mesmo cache do
+    dataset em memória (ver data.SourceCache); o observador do csv (ver
+    watch) faz isso em segundo plano.
+
+    Cada consulta é um GROUP BY sobre a tabela orders que devolve as mesmas
+    somas do cubo de métricas e do rollup por entregador (ver cube e
+    riders); as médias e desvios saem do mesmo cube.summarize. Ativado com
+    CURRYCOMPANY_BACKEND=sqlite (ver config e query).
+
+    Reconstruir o arquivo manualmente:
+
+        python -m currycompany.sqlbackend
+        python -m currycompany.sqlbackend --check
+"""
+# libraries
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from currycompany import config
+from currycompany.config import CHUNKSIZE
+from currycompany.cube import CUBE_DIMENSIONS, CUBE_METRICS, STATISTICS, summarize
+from currycompany.data import (DATASET_PATH, SourceCache, SourceEntry, clean_code, derive_columns,
+                               read_position, read_raw, source_signature)
+from currycompany.filters import FILTER_COLUMNS
+from currycompany.instrument import timed
+from currycompany.riders import RIDER_KEYS
+from currycompany.schema import compact_schema
+from currycompany.spatial import POINTS, cell_frame, cell_position, grid_columns
+
+# Aumentar sempre que a tabela orders mudar, para invalidar os arquivos
+# gravados por versões anteriores
+DATABASE_VERSION = 4
+
+# coluna -> tipo na tabela orders. Order_Date é gravada como dias desde
+# 1970-01-01 (inteiro), o que deixa o filtro de datas uma comparação simples
+ORDER_COLUMNS = {
+    'Order_Date': 'INTEGER',
+    'Delivery_person_ID': 'TEXT',
+    'City': 'TEXT',
+    'Road_traffic_density': 'TEXT',
+    'Festival': 'TEXT',
+    'Type_of_order': 'TEXT',
+    'Weatherconditions': 'TEXT',
+    'Delivery_person_Age': 'INTEGER',
+    'Vehicle_condition': 'INTEGER',
+    'Delivery_person_Ratings': 'REAL',
+    'Time_taken(min)': 'INTEGER',
+    'distance': 'REAL',
+    'Delivery_location_latitude': 'REAL',
+    'Delivery_location_longitude': 'REAL',
+    'Restaurant_latitude': 'REAL',
+    'Restaurant_longitude': 'REAL',
+}
+
+# coluna do rollup por entregador -> expressão SQL (ver riders.RIDER_MERGE)
+RIDER_EXPRESSIONS = {
+    'orders': 'COUNT(*)',
+    'ratings_n': 'COUNT("Delivery_person_Ratings")',
+    'ratings_sum': 'TOTAL("Delivery_person_Ratings")',
+    'time_sum': 'SUM("Time_taken(min)")',
+    'age_min': 'MIN("Delivery_person_Age")',
+    'age_max': 'MAX("Delivery_person_Age")',
+    'vehicle_min': 'MIN("Vehicle_condition")',
+    'vehicle_max': 'MAX("Vehicle_condition")',
+    'latitude_sum': 'TOTAL("Delivery_location_latitude")',
+    'longitude_sum': 'TOTAL("Delivery_location_longitude")',
+    'location_n': 'COUNT("Delivery_location_latitude")',
+}
+
+# Tipos das colunas devolvidas (sem linhas, o pandas as leria como object)
+CUBE_TYPES = dict({'orders': 'int64'},
+                  **{'{}_{}'.format(metric, stat): 'int64' if stat == 'n' else 'float64'
+                     for metric in CUBE_METRICS for stat in STATISTICS})
+RIDER_TYPES = {name: 'float64' if name.endswith('_sum') and name != 'time_sum' else 'int64'
+               for name in RIDER_EXPRESSIONS}
+
+_lock = threading.Lock()
+
+# Dias e rótulos de cada arquivo: caminho do csv -> (assinatura, (dias, rótulos))
+_spaces = {}
+
+# Conexões somente leitura de cada thread: caminho do csv -> (assinatura, conexão)
+_local = threading.local()
+
+
+def database_path(source):
+    """ Caminho do arquivo SQLite correspondente a um csv (mesmo nome, .sqlite). """
+    return os.path.splitext(source)[0] + '.sqlite'
+
+
+def _quote(column):
+    return '"{}"'.format(column)
+
+
+def _metadata(signature, offset, fingerprint):
+    # offset: bytes do csv já inseridos; fingerprint: bytes antes dele (ver
+    # data.tail_fingerprint), vazio quando o csv mudou durante a leitura
+    _, mtime_ns, size = signature
+    return {'version': str(DATABASE_VERSION), 'mtime_ns': str(mtime_ns), 'size': str(size),
+            'offset': str(offset), 'fingerprint': '' if fingerprint is None else fingerprint.hex()}
+
+
+def _read_meta(source):
+    target = database_path(source)
+    if not os.path.exists(target):
+        return None
+
+    try:
+        con = sqlite3.connect('file:{}?mode=ro'.format(target), uri=True)
+        try:
+            return dict(con.execute('SELECT key, value FROM meta').fetchall())
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return None
+
+
+def database_is_fresh(source, signature):
+    """ Verifica se o arquivo existe e foi construído a partir do csv atual.
+
+        Imput: caminho do csv, assinatura atual do csv
+        Output: True se o arquivo pode ser usado
+    """
+    meta = _read_meta(source)
+    _, mtime_ns, size = signature
+
+    return (meta is not None and meta.get('version') == str(DATABASE_VERSION)
+            and meta.get('mtime_ns') == str(mtime_ns) and meta.get('size') == str(size))
+
+
+def _chunk_rows(chunk):
+    # colunas como listas de valores Python (None nos ausentes), na ordem de
+    # ORDER_COLUMNS
+    columns = []
+    for col in ORDER_COLUMNS:
+        values = chunk[col]
+        if col == 'Order_Date':
+            columns.append(values.to_numpy().astype('datetime64[D]').astype('int64').tolist())
+        elif ORDER_COLUMNS[col] == 'TEXT':
+            values = values.astype(object)
+            columns.append(values.where(values.notna(), None).tolist())
+        else:
+            array = values.to_numpy(dtype='float64' if ORDER_COLUMNS[col] == 'REAL' else None)
+            columns.append([None if x != x else x for x in array.tolist()])
+
+    return zip(*columns)
+
+
+def _insert(con, raw):
+    # limpa um bloco bruto do csv e insere os pedidos na tabela orders
+    chunk = compact_schema(derive_columns(clean_code(raw)))
+    con.executemany('INSERT INTO orders VALUES ({})'.format(', '.join('?' * len(ORDER_COLUMNS))),
+                    _chunk_rows(chunk))
+
+
+@timed('sqlite_build')
+def build_database(source=DATASET_PATH, chunksize=CHUNKSIZE):
+    """ Constrói o arquivo SQLite a partir do csv, lido em blocos.
+
+        A escrita é feita em um arquivo temporário e depois renomeada, para
+        que um leitor concorrente nunca veja um arquivo pela metade.
+
+        Imput: caminho do csv, linhas por bloco
+        Output: caminho do arquivo gravado
+    """
+    signature = source_signature(source)
+    target = database_path(source)
+    tmp = target + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    columns = ', '.join('{} {}'.format(_quote(col), kind) for col, kind in ORDER_COLUMNS.items())
+
+    con = sqlite3.connect(tmp)
+    try:
+        con.execute('PRAGMA journal_mode = OFF')
+        con.execute('PRAGMA synchronous = OFF')
+        con.execute('CREATE TABLE orders ({})'.format(columns))
+        con.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+
+        for raw in read_raw(source, chunksize=chunksize):
+            _insert(con, raw)
+
+        con.execute('CREATE INDEX orders_date ON orders ("Order_Date")')
+        con.executemany('INSERT INTO meta VALUES (?, ?)',
+                        _metadata(signature, *read_position(source, signature)).items())
+        con.commit()
+    finally:
+        con.close()
+
+    os.replace(tmp, target)
+
+    return target
+
+
+@timed('sqlite_append')
+def _append_database(source, entry, raw):
+    """ Insere no arquivo só as linhas acrescentadas ao fim do csv.
+
+        A inserção e a nova meta são gravadas em uma única transação; os
+        leitores continuam vendo o arquivo anterior até o commit.
+    """
+    con = sqlite3.connect(database_path(source))
+    try:
+        with con:
+            _insert(con, raw)
+            con.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                            _metadata(entry.signature, entry.offset, entry.fingerprint).items())
+    finally:
+        con.close()
+
+
+def _restore(source):
+    # arquivo gravado por outro processo (ou por uma execução anterior), na
+    # versão em que a meta diz que ele está
+    meta = _read_meta(source)
+    if meta is None or meta.get('version') != str(DATABASE_VERSION):
+        return None
+
+    signature = (os.path.abspath(source), int(meta['mtime_ns']), int(meta['size']))
+    return SourceEntry(signature, None, int(meta['offset']), bytes.fromhex(meta['fingerprint']) or None)
+
+
+# Arquivos conferidos por este processo: caminho absoluto do csv ->
+# SourceEntry com a assinatura com que o arquivo foi verificado ou construído
+_databases = SourceCache(lambda source, signature: build_database(source), _append_database, _restore)
+
+
+def ensure_database(source=DATASET_PATH):
+    """ Garante que o arquivo SQLite é da versão atual do csv.
+
+        O arquivo é conferido uma vez por assinatura do csv. Se o csv só
+        recebeu linhas novas, elas são inseridas (ver data.SourceCache); se
+        foi reescrito, o arquivo é reconstruído. Sessões simultâneas esperam
+        uma única atualização.
+
+        Imput: caminho do csv
+        Output: assinatura do csv com que o arquivo foi conferido
+    """
+    return _databases.load(source).signature
+
+
+def refresh(source=DATASET_PATH):
+    """ Incorpora as mudanças do csv ao arquivo, se este processo já o usa.
+
+        Usado pelo observador de arquivo (ver watch) para que as sessões não
+        esperem pela inserção das linhas novas.
+    """
+    _databases.refresh(source)
+
+
+def _connection(source):
+    signature = ensure_database(source)
+
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    cached = connections.get(source)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    if cached is not None:
+        cached[1].close()
+
+    con = sqlite3.connect('file:{}?mode=ro'.format(database_path(source)), uri=True)
+    connections[source] = (signature, con)
+
+    return con
+
+
+def _query(source, sql, params=()):
+    return pd.read_sql_query(sql, _connection(source), params=list(params))
+
+
+def _where(state):
+    # Estado normalizado (ver selection.normalized_state) -> cláusula WHERE.
+    # Os nomes das colunas vêm de FILTER_COLUMNS; os rótulos são parâmetros
+    last_day, filters = state
+    if last_day is None:
+        return 'WHERE 0', []
+
+    clauses = ['"Order_Date" <= ?']
+    params = [int(np.datetime64(last_day, 'D').astype('int64'))]
+    for col, labels in filters:
+        if col not in FILTER_COLUMNS:
+            raise ValueError('coluna de filtro desconhecida: {!r}'.format(col))
+        if labels:
+            clauses.append('{} IN ({})'.format(_quote(col), ', '.join('?' * len(labels))))
+            params.extend(labels)
+        else:
+            clauses.append('0')
+
+    return 'WHERE ' + ' AND '.join(clauses), params
+
+
+def _typed(df, types):
+    # Order_Date volta de dias para datetime64 e os valores para os seus tipos
+    df = df.astype(types)
+    if 'Order_Date' in df.columns:
+        df['Order_Date'] = df['Order_Date'].to_numpy(dtype='int64').astype('datetime64[D]').astype('datetime64[ns]')
+
+    return df
+
+
+def cube_sums(state, by, source=DATASET_PATH):
+    """ Somas do cubo de métricas agrupadas por by, direto da tabela orders.
+
+        Imput: estado normalizado, dimensões do cubo ([] para o total),
+               caminho do csv
+        Output: dataframe indexado pelas dimensões com as colunas de
+                cube.CUBE_VALUES
+    """
+    metrics = ['COUNT(*) AS orders']
+    for metric, col in CUBE_METRICS.items():
+        metrics += ['COUNT({0}) AS {1}_n'.format(_quote(col), metric),
+                    'TOTAL({0}) AS {1}_sum'.format(_quote(col), metric),
+                    'TOTAL({0} * {0}) AS {1}_sumsq'.format(_quote(col), metric)]
+
+    where, params = _where(state)
+    dims = ', '.join(_quote(dim) for dim in by)
+    sql = 'SELECT {} FROM orders {}'.format(', '.join(([dims] if by else []) + metrics), where)
+    if by:
+        sql += ' GROUP BY {0} ORDER BY {0}'.format(dims)
+
+    sums = _typed(_query(source, sql, params), CUBE_TYPES)
+
+    return sums.set_index(by) if by else sums
+
+
+def cells(state, source=DATASET_PATH):
+    """ Células do cubo de métricas selecionadas (mesmo formato de cube.load_cube). """
+    return cube_sums(state, CUBE_DIMENSIONS, source).reset_index()
+
+
+def rollup(state, by, source=DATASET_PATH):
+    """ Contagem, média e desvio por dimensões (mesmo formato de cube.rollup). """
+    return summarize(cube_sums(state, by, source))
+
+
+def riders(state, source=DATASET_PATH):
+    """ Rollup por entregador selecionado (mesmo formato de riders.load_riders). """
+    keys = ', '.join(_quote(key) for key in RIDER_KEYS)
+    values = ', '.join('{} AS {}'.format(expression, name) for name, expression in RIDER_EXPRESSIONS.items())
+    where, params = _where(state)
+
+    sql = 'SELECT {0}, {1} FROM orders {2} GROUP BY {0} ORDER BY {0}'.format(keys, values, where)
+
+    return _typed(_query(source, sql, params), RIDER_TYPES)
+
+
+def daily_orders(state, source=DATASET_PATH):
+    """ Pedidos por dia (mesmo formato de selection.daily_orders). """
+    df_aux = cube_sums(state, ['Order_Date'], source)[['orders']].reset_index()
+    df_aux.columns = ['order_date', 'qtde_entregas']
+
+    return df_aux
+
+
+def grid_cells(state, point='delivery', bbox=None, source=DATASET_PATH):
+    """ Pedidos e tempo médio por célula da grade espacial (mesmo formato de
+        spatial.SpatialIndex.cells).
+
+        A célula de cada pedido é calculada na consulta com a mesma fórmula
+        de spatial.cell_keys (as coordenadas válidas somadas a 90 e 180 são
+        positivas, então o CAST trunca como o floor).
+
+        Imput: estado normalizado, ponto ('delivery' ou 'restaurant'),
+               retângulo (sul, oeste, norte, leste) ou None, caminho do csv
+        Output: dataframe com cell, latitude, longitude, orders e time_mean
+    """
+    latitude, longitude = (_quote(col) for col in POINTS[point])
+    degrees = float(config.GRID_DEGREES)
+    where, params = _where(state)
+
+    inner = ('SELECT CAST(({0} + 90) / {2!r} AS INTEGER) AS cell_row, '
+             'CAST(({1} + 180) / {2!r} AS INTEGER) AS cell_col, "Time_taken(min)" AS minutes '
+             'FROM orders {3} AND {0} IS NOT NULL AND {1} IS NOT NULL').format(latitude, longitude, degrees, where)
+
+    outer = ''
+    if bbox is not None:
+        south, west, north, east = bbox
+        rows, cols = cell_position([south, north], [west, east], degrees)
+        outer = 'WHERE cell_row BETWEEN ? AND ? AND cell_col BETWEEN ? AND ?'
+        params = params + [int(rows[0]), int(rows[1]), int(cols[0]), int(cols[1])]
+
+    sql = ('SELECT cell_row * {0} + cell_col AS cell, COUNT(*) AS orders, TOTAL(minutes) AS time_sum '
+           'FROM ({1}) {2} GROUP BY cell ORDER BY cell').format(grid_columns(degrees), inner, outer)
+
+    df = _query(source, sql, params)
+
+    return cell_frame(df['cell'].to_numpy(dtype='int64'), df['orders'].to_numpy(dtype='int64'),
+                      df['time_sum'].to_numpy(dtype='float64'), degrees)
+
+
+def state_space(source=DATASET_PATH):
+    """ Dias e rótulos dos filtros direto do arquivo (ver selection.state_space).
+
+        Consultados uma vez por versão do csv.
+    """
+    signature = ensure_database(source)
+    with _lock:
+        cached = _spaces.get(source)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    days = _query(source, 'SELECT DISTINCT "Order_Date" FROM orders ORDER BY 1')['Order_Date']
+    days = days.to_numpy(dtype='int64').astype('datetime64[D]').astype('datetime64[ns]')
+
+    labels = {}
+    for col in FILTER_COLUMNS:
+        values = _query(source, 'SELECT DISTINCT {0} FROM orders WHERE {0} IS NOT NULL'.format(_quote(col)))
+        labels[col] = values.iloc[:, 0].tolist()
+
+    with _lock:
+        _spaces[source] = (signature, (days, labels))
+
+    return days, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m currycompany.sqlbackend',
+        description='Reconstrói o arquivo SQLite do dataset limpo.')
+    parser.add_argument('--source', default=DATASET_PATH, help='csv de origem')
+    parser.add_argument('--check', action='store_true',
+                        help='apenas verifica se o arquivo está atualizado')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        fresh = database_is_fresh(args.source, source_signature(args.source))
+        print('{}: {}'.format(database_path(args.source), 'atualizado' if fresh else 'desatualizado'))
+        return 0 if fresh else 1
+
+    target = build_database(args.source)
+    print('arquivo gravado em {}'.format(target))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+""" Relatórios pré-calculados gravados ao lado do csv.
+
+    O CLI de currycompany.reports calcula os relatórios dos gráficos para
+    um conjunto de datas e filtros e os grava em dataset/reports/, um
+    diretório por estado da barra lateral e um arquivo (Parquet ou json) por
+    relatório. O manifest.json guarda a assinatura do csv de origem, os dias
+    e os rótulos dos filtros: com ele a chave de um estado pode ser montada
+    sem carregar o dataset (ver selection.normalized_state), e o dashboard
+    serve os relatórios prontos enquanto o csv não mudar.
+
+    Cada gravação vai para um diretório novo (dataset/reports/store-*), e o
+    arquivo CURRENT, trocado com um único os.replace, aponta para o atual.
+    O diretório anterior é mantido, para os processos que ainda leem o
+    manifest dele; os mais antigos são apagados.
+"""
+# libraries
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+# Aumentar sempre que a saída de algum relatório mudar, para invalidar os
+# relatórios gravados por versões anteriores
+STORE_VERSION = 4
+
+FORMATS = {'parquet': '.parquet', 'json': '.json'}
+
+_MANIFEST = 'manifest.json'
+
+# arquivo com o nome do diretório atual
+_CURRENT = 'CURRENT'
+
+# Manifest lido por caminho do diretório: (assinatura, manifest ou None)
+_manifests = {}
+_lock = threading.Lock()
+
+
+def store_dir(source):
+    """ Diretório dos relatórios de um csv (dataset/reports). """
+    return os.path.join(os.path.dirname(os.path.abspath(source)), 'reports')
+
+
+def state_id(state):
+    """ Nome do diretório de um estado normalizado.
+
+        Ex.: (('2022-04-05', (('Road_traffic_density', ('Jam', 'Low')),)))
+        vira '2022-04-05__Road_traffic_density=Jam,Low'.
+    """
+    last_day, filters = state
+    parts = [last_day or 'vazio']
+    parts += ['{}={}'.format(col, ','.join(labels)) for col, labels in filters]
+
+    return '__'.join(parts)
+
+
+def _current_dir(root):
+    try:
+        with open(os.path.join(root, _CURRENT)) as f:
+            return os.path.join(root, f.read().strip())
+    except OSError:
+        return None
+
+
+def _read_manifest(root):
+    # manifest do diretório atual, com o caminho do diretório em 'directory'
+    directory = _current_dir(root)
+    if directory is None:
+        return None
+
+    try:
+        with open(os.path.join(directory, _MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    manifest['directory'] = directory
+
+    return manifest
+
+
+def _restore_dtypes(frame, dtypes):
+    # o json não guarda a largura dos inteiros (int8 volta como int64); as
+    # categorias voltam pelo schema do próprio json
+    changed = {col: dtype for col, dtype in dtypes.items()
+               if dtype != 'category' and str(frame[col].dtype) != dtype}
+
+    return frame.astype(changed) if changed else frame
+
+
+def load_manifest(source, signature):
+    """ Manifest dos relatórios, se eles foram gerados desta versão do csv.
+
+        O manifest é lido uma vez por assinatura do csv.
+
+        Imput: caminho do csv, assinatura do csv (ver data.source_signature)
+        Output: dicionário do manifest ou None
+    """
+    root = store_dir(source)
+
+    with _lock:
+        cached = _manifests.get(root)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        manifest = _read_manifest(root)
+        if manifest is not None and (manifest.get('version') != STORE_VERSION
+                                     or manifest.get('mtime_ns') != signature[1]
+                                     or manifest.get('size') != signature[2]):
+            manifest = None
+
+        _manifests[root] = (signature, manifest)
+
+        return manifest
+
+
+def read_report(source, signature, name, state):
+    """ Relatório pré-calculado de um estado, ou None se não houver.
+
+        Imput: caminho do csv, assinatura do csv, nome do relatório, estado
+               normalizado (ver selection.normalized_state)
+        Output: dataframe ou None
+    """
+    manifest = load_manifest(source, signature)
+    if manifest is None:
+        return None
+
+    entry = manifest['reports'].get(state_id(state), {}).get(name)
+    if entry is None:
+        return None
+
+    path = os.path.join(manifest['directory'], entry['file'])
+    try:
+        if manifest['format'] == 'parquet':
+            frame = pd.read_parquet(path)
+        else:
+            frame = pd.read_json(path, orient='table')
+    except OSError:
+        # diretório apagado por gravações mais novas: o manifest é relido
+        # na próxima consulta e este relatório é calculado
+        with _lock:
+            _manifests.pop(store_dir(source), None)
+        return None
+
+    return _restore_dtypes(frame, entry['dtypes'])
+
+
+def write_store(source, signature, days, labels, reports, fmt='parquet'):
+    """ Grava os relatórios e o manifest, substituindo os anteriores.
+
+        Os arquivos são gravados em um diretório novo e só então o CURRENT
+        passa a apontar para ele, então um leitor vê ou os relatórios
+        anteriores ou os novos, nunca um diretório ausente ou pela metade.
+
+        Imput: caminho do csv, assinatura do csv, dias do dataset (iso),
+               rótulos por coluna filtrável, dicionário estado -> {nome do
+               relatório: dataframe}, formato ('parquet' ou 'json')
+        Output: diretório dos relatórios
+    """
+    root = store_dir(source)
+    directory = os.path.join(root, 'store-{}-{}'.format(time.time_ns(), os.getpid()))
+    os.makedirs(directory)
+
+    entries = {}
+    for state, frames in reports.items():
+        sid = state_id(state)
+        os.makedirs(os.path.join(directory, sid))
+
+        for name, frame in frames.items():
+            filename = os.path.join(sid, name + FORMATS[fmt])
+            if fmt == 'parquet':
+                frame.to_parquet(os.path.join(directory, filename), index=False)
+            else:
+                frame.to_json(os.path.join(directory, filename), orient='table', index=False)
+            entries.setdefault(sid, {})[name] = {
+                'file': filename,
+                'dtypes': {col: str(dtype) for col, dtype in frame.dtypes.items()},
+            }
+
+    manifest = {
+        'version': STORE_VERSION,
+        'mtime_ns': signature[1],
+        'size': signature[2],
+        'format': fmt,
+        'days': list(days),
+        'labels': labels,
+        'reports': entries,
+    }
+    with open(os.path.join(directory, _MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    previous = _current_dir(root)
+    pointer = os.path.join(root, _CURRENT + '.tmp')
+    with open(pointer, 'w') as f:
+        f.write(os.path.basename(directory))
+    os.replace(pointer, os.path.join(root, _CURRENT))
+
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith('store-') and path not in (directory, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
+    with _lock:
+        _manifests.pop(root, None)
+
+    return directory
@@ -0,0 +1,170 @@
+""" Ingestão do csv em blocos, mantendo apenas os agregados em memória.
+
+    Cada bloco do csv passa pela mesma limpeza do modo em memória e é
+    reduzido ao cubo de métricas (ver cube), ao rollup por entregador (ver
+    riders) e aos índices espaciais (ver spatial). Os agregados parciais são
+    compactados periodicamente.
+
+    Só a leitura é limitada pelo tamanho do bloco. Os agregados guardados
+    crescem com o histórico: o cubo com as combinações de dia e dimensões, o
+    rollup com os pares entregador-dia (por combinação de filtros; quase um
+    por pedido quando cada entregador faz poucas entregas por dia) e os
+    índices espaciais com os pares célula-dia de cada rótulo de trânsito.
+    O modo dispensa o dataframe de pedidos e as colunas que os relatórios
+    não usam, mas a memória residente é limitada pelos pares entregador-dia
+    e célula-dia distintos, e não pelo bloco.
+
+    Ativado com CURRYCOMPANY_INGEST=stream (ver config).
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+from currycompany.config import CHUNKSIZE
+from currycompany.cube import build_cube, kept_rows, merge_cubes, replace_days
+from currycompany.data import DATASET_PATH, SourceCache, clean_code, derive_columns, read_raw
+from currycompany.dateindex import DateIndex
+from currycompany.filters import FILTER_COLUMNS, FilterIndex
+from currycompany.instrument import timed
+from currycompany.riders import (RIDER_FILTER_COLUMNS, build_rider_rollup,
+                                 merge_rider_rollups)
+from currycompany.schema import compact_schema
+from currycompany.spatial import POINTS, SpatialIndex, build_grid, cell_frame, order_sums, sum_cells
+
+# Quantos agregados parciais acumular antes de compactá-los em um só
+COMPACT_EVERY = 8
+
+
+class StreamAggregates:
+    """ Agregados de uma versão do csv, sem o dataframe de pedidos.
+
+        Atributos:
+            cube: cubo de métricas por dia
+            riders: rollup diário por entregador
+            spatial: ponto -> índice espacial (ver spatial)
+            rows: quantidade de pedidos válidos agregados
+            date_index: dias do cubo (ver dateindex)
+            cube_filter_index, rider_filter_index: códigos para os filtros
+
+        Os índices são construídos a partir do cubo e do rollup, a não ser
+        que venham prontos (ver append_chunk).
+    """
+
+    def __init__(self, cube, riders, spatial, rows, date_index=None,
+                 cube_filter_index=None, rider_filter_index=None):
+        self.cube = cube
+        self.riders = riders
+        self.spatial = spatial
+        self.rows = rows
+        if date_index is None:
+            date_index = DateIndex(cube['Order_Date'].to_numpy())
+        if cube_filter_index is None:
+            cube_filter_index = FilterIndex(cube, FILTER_COLUMNS)
+        if rider_filter_index is None:
+            rider_filter_index = FilterIndex(riders, RIDER_FILTER_COLUMNS)
+
+        self.date_index = date_index
+        self.cube_filter_index = cube_filter_index
+        self.rider_filter_index = rider_filter_index
+
+
+@timed('stream_ingest')
+def ingest_stream(path=DATASET_PATH, chunksize=CHUNKSIZE):
+    """ Lê o csv em blocos e devolve apenas os agregados.
+
+        Imput: caminho do csv, linhas por bloco
+        Output: StreamAggregates
+    """
+    cubes, riders, rows = [], [], 0
+    spatial = {point: SpatialIndex(None, point) for point in POINTS}
+
+    for raw in read_raw(path, chunksize=chunksize):
+        chunk = compact_schema(derive_columns(clean_code(raw)))
+        rows += len(chunk)
+
+        cubes.append(build_cube(chunk))
+        riders.append(build_rider_rollup(chunk))
+        spatial = {point: index.merged(build_grid(chunk, point)) for point, index in spatial.items()}
+
+        if len(cubes) >= COMPACT_EVERY:
+            cubes = [merge_cubes(cubes)]
+            riders = [merge_rider_rollups(riders)]
+
+    return StreamAggregates(merge_cubes(cubes), merge_rider_rollups(riders), spatial, rows)
+
+
+def append_chunk(aggregates, chunk):
+    """ Agregados com um bloco de linhas novas (já limpas) incorporado.
+
+        Só os dias presentes no bloco são refeitos no cubo e no rollup, e os
+        índices de datas e de filtros só recalculam as linhas desses dias
+        (ver cube.kept_rows); as linhas do bloco são intercaladas nos
+        índices espaciais.
+
+        Imput: StreamAggregates, dataframe limpo das linhas novas
+        Output: novo StreamAggregates
+    """
+    cube = replace_days(aggregates.cube, build_cube(chunk), merge_cubes)
+    riders = replace_days(aggregates.riders, build_rider_rollup(chunk), merge_rider_rollups)
+    spatial = {point: index.merged(build_grid(chunk, point))
+               for point, index in aggregates.spatial.items()}
+
+    cube_keep, rider_keep = kept_rows(cube, chunk), kept_rows(riders, chunk)
+    date_index = aggregates.date_index.replaced(cube_keep, cube['Order_Date'].to_numpy()[cube_keep:])
+    cube_filter_index = aggregates.cube_filter_index.extended(cube_keep, cube.iloc[cube_keep:])
+    rider_filter_index = aggregates.rider_filter_index.extended(rider_keep, riders.iloc[rider_keep:])
+
+    return StreamAggregates(cube, riders, spatial, aggregates.rows + len(chunk),
+                            date_index, cube_filter_index, rider_filter_index)
+
+
+@timed('stream_scan_cells')
+def scan_grid_cells(date_limit, selections, point='delivery', bbox=None,
+                    path=DATASET_PATH, chunksize=CHUNKSIZE):
+    """ Células da grade espacial lendo o csv em blocos.
+
+        Para filtros que os índices espaciais não guardam (ver
+        selection.grid_cells): cada bloco é limpo, filtrado e reduzido às
+        somas por célula, então a memória continua limitada pelo bloco.
+
+        Imput: data limite, dicionário coluna -> rótulos, ponto, retângulo
+               ou None, caminho do csv, linhas por bloco
+        Output: dataframe com cell, latitude, longitude, orders e time_mean
+    """
+    limit = np.datetime64(pd.Timestamp(date_limit), 'ns')
+    parts = []
+
+    for raw in read_raw(path, chunksize=chunksize):
+        chunk = compact_schema(derive_columns(clean_code(raw)))
+        keep = chunk['Order_Date'].to_numpy() < limit
+        mask = FilterIndex(chunk).mask(selections)
+        if mask is not None:
+            keep &= mask
+        parts.append(order_sums(chunk.take(np.flatnonzero(keep)), point, bbox))
+
+    cells, orders, time_sum = (np.concatenate(values) for values in zip(*parts))
+
+    return cell_frame(*sum_cells(cells, orders, time_sum))
+
+
+def _append_tail(path, entry, raw):
+    return append_chunk(entry.value, compact_schema(derive_columns(clean_code(raw))))
+
+
+# Cache do processo: caminho absoluto -> SourceEntry com os agregados da
+# versão atual do csv
+_streams = SourceCache(lambda path, signature: ingest_stream(path), _append_tail)
+
+
+def load_stream_aggregates(path=DATASET_PATH):
+    """ Agregados da versão atual do csv, ingeridos uma vez por processo.
+
+        Se o csv apenas recebeu linhas no fim, só essas linhas são lidas e
+        incorporadas aos agregados.
+    """
+    return _streams.load(path).value
+
+
+def refresh(path=DATASET_PATH):
+    """ Incorpora as mudanças do csv aos agregados, se já foram carregados. """
+    _streams.refresh(path)
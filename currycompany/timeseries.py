@@ -0,0 +1,126 @@
+""" Séries por período (dia, semana, mês, ...) com quantidade de pontos limitada.
+
+    Os gráficos de datas partem de séries diárias que já existem (índice de
+    datas, rollup do cubo por Order_Date, rollup por entregador). O período
+    é escolhido automaticamente: o menor entre dia, semana, mês, trimestre
+    e ano em que os dias selecionados cabem em no máximo MAX_CHART_POINTS
+    pontos (ver config). Assim o tamanho do gráfico enviado ao navegador não
+    cresce com o histórico, e a reamostragem é uma soma por intervalos sobre
+    os dias já ordenados, sem agrupar os pedidos de novo.
+
+    As semanas começam no domingo, como o %U usado antes nos gráficos.
+"""
+# libraries
+import numpy as np
+import pandas as pd
+
+from currycompany import config
+
+BUCKETS = ('day', 'week', 'month', 'quarter', 'year')
+
+# rótulo do eixo de cada período
+BUCKET_LABELS = {
+    'day': 'dia',
+    'week': 'semana',
+    'month': 'mês',
+    'quarter': 'trimestre',
+    'year': 'ano',
+}
+
+
+def bucket_starts(dates, bucket):
+    """ Primeiro dia do período de cada data.
+
+        Imput: array ou series de datas, período (ver BUCKETS)
+        Output: array datetime64[ns]
+    """
+    days = np.asarray(dates, dtype='datetime64[ns]').astype('datetime64[D]')
+
+    if bucket == 'day':
+        starts = days
+    elif bucket == 'week':
+        # 1970-01-01 foi uma quinta: +4 faz o domingo valer 0
+        starts = days - (days.astype('int64') + 4) % 7
+    elif bucket == 'month':
+        starts = days.astype('datetime64[M]')
+    elif bucket == 'quarter':
+        months = days.astype('datetime64[M]').astype('int64')
+        starts = (months - months % 3).astype('datetime64[M]')
+    elif bucket == 'year':
+        starts = days.astype('datetime64[Y]')
+    else:
+        raise ValueError('período desconhecido: {!r}'.format(bucket))
+
+    return starts.astype('datetime64[ns]')
+
+
+def _breaks(starts):
+    # posições (em um array ordenado) onde começa cada período
+    if not len(starts):
+        return np.zeros(0, dtype='int64')
+
+    return np.concatenate([[0], np.flatnonzero(starts[1:] != starts[:-1]) + 1])
+
+
+def choose_bucket(days, min_bucket='day', max_points=None):
+    """ Menor período, a partir de min_bucket, com no máximo max_points pontos.
+
+        Imput: dias selecionados (ordenados), menor período aceito, limite
+               de pontos (padrão: config.MAX_CHART_POINTS)
+        Output: nome do período
+    """
+    if max_points is None:
+        max_points = config.MAX_CHART_POINTS
+
+    for bucket in BUCKETS[BUCKETS.index(min_bucket):]:
+        if len(_breaks(bucket_starts(days, bucket))) <= max_points:
+            return bucket
+
+    return BUCKETS[-1]
+
+
+def resample(days, values, min_bucket='day', max_points=None):
+    """ Soma uma série diária por período escolhido automaticamente.
+
+        Imput: dias (ordenados, sem repetição), valores de cada dia, menor
+               período aceito, limite de pontos
+        Output: (período, array com o início de cada período, somas)
+    """
+    bucket = choose_bucket(days, min_bucket, max_points)
+    starts = bucket_starts(days, bucket)
+    breaks = _breaks(starts)
+
+    values = np.asarray(values)
+    sums = np.add.reduceat(values, breaks) if len(breaks) else values[:0]
+
+    return bucket, starts[breaks], sums
+
+
+def count_unique(dates, keys, min_bucket='day', max_points=None):
+    """ Quantidade de chaves distintas por período escolhido automaticamente.
+
+        Imput: datas de cada linha (ordenadas), chave de cada linha (ex.:
+               entregador), menor período aceito, limite de pontos
+        Output: (período, array com o início de cada período, contagens)
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    days = dates[_breaks(dates)]
+
+    bucket = choose_bucket(days, min_bucket, max_points)
+    starts = bucket_starts(dates, bucket)
+
+    keys = pd.Series(keys).reset_index(drop=True)
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        keys = keys.cat.codes
+    counts = keys.groupby(starts, sort=True).nunique()
+
+    return bucket, counts.index.to_numpy(dtype='datetime64[ns]'), counts.to_numpy()
+
+
+def bucket_frame(bucket, starts, values, value_column):
+    """ Dataframe de uma série por período, como os relatórios devolvem.
+
+        Imput: período, inícios dos períodos, valores, nome da coluna
+        Output: dataframe com as colunas period, value_column e bucket
+    """
+    return pd.DataFrame({'period': starts, value_column: values, 'bucket': bucket})
@@ -0,0 +1,100 @@
+""" Aquecimento do processo: dados e relatórios da visão padrão em segundo plano.
+
+    Sem o aquecimento, o primeiro visitante depois de um deploy paga a
+    leitura e limpeza do csv (ou do snapshot), a construção do cubo, do
+    rollup por entregador e dos índices e todos os relatórios do estado
+    padrão da barra lateral. Com ele (CURRYCOMPANY_WARMUP, ligado por
+    padrão), uma thread faz esse trabalho assim que o processo começa:
+
+        python -m currycompany.serve     (inicia o aquecimento e o servidor)
+        streamlit run Home.py            (inicia na primeira página aberta)
+
+    Páginas abertas durante o aquecimento não repetem o trabalho: o cache de
+    figuras e agregados faz quem pede uma chave em cálculo esperar por ela
+    (ver cache.FigureCache), e os relatórios prontos já vêm do cache.
+"""
+# libraries
+import datetime
+import logging
+import os
+import threading
+import time
+
+from currycompany import config
+from currycompany.data import DATASET_PATH
+from currycompany.instrument import stage, start_run
+
+logger = logging.getLogger('currycompany.warmup')
+
+# Estado padrão da barra lateral das páginas
+DEFAULT_DATE_LIMIT = datetime.datetime(2022, 4, 13)
+DEFAULT_SELECTIONS = {'Road_traffic_density': ['Low', 'Medium', 'High', 'Jam']}
+
+# caminho absoluto -> WarmupStatus
+_status = {}
+_lock = threading.Lock()
+
+
+class WarmupStatus:
+    """ Andamento do aquecimento de um csv.
+
+        Atributos:
+            state: 'running', 'done' ou 'failed'
+            seconds: duração (None enquanto roda)
+            error: mensagem do erro, se falhou
+    """
+
+    def __init__(self):
+        self.state = 'running'
+        self.seconds = None
+        self.error = None
+
+
+def warm_up(path=DATASET_PATH):
+    """ Carrega os dados e calcula os relatórios e o mapa da visão padrão.
+
+        Imput: caminho do csv
+        Output: None
+    """
+    # imports locais: Home.py importa este módulo e o seu orçamento de
+    # importação não inclui os relatórios (ver benchmarks.importtime)
+    from currycompany.maps import map_html
+    from currycompany.reports import REPORTS, get_reports
+
+    start_run('warmup')
+    with stage('warmup'):
+        get_reports(list(REPORTS), DEFAULT_DATE_LIMIT, DEFAULT_SELECTIONS, path)
+        map_html(DEFAULT_DATE_LIMIT, DEFAULT_SELECTIONS, 'medians', path)
+
+
+def _run(path, status):
+    start = time.perf_counter()
+    try:
+        warm_up(path)
+        status.state = 'done'
+    except Exception as error:
+        # o aquecimento é só uma antecipação: a página calcula o que faltar
+        logger.exception('falha no aquecimento de %s', path)
+        status.state, status.error = 'failed', str(error)
+    finally:
+        status.seconds = time.perf_counter() - start
+
+
+def ensure_warmup(path=DATASET_PATH):
+    """ Inicia (uma única vez por processo) o aquecimento em segundo plano.
+
+        Imput: caminho do csv
+        Output: WarmupStatus, ou None se o aquecimento estiver desligado
+    """
+    if not config.WARMUP:
+        return None
+
+    key = os.path.abspath(path)
+    with _lock:
+        status = _status.get(key)
+        if status is None:
+            status = _status[key] = WarmupStatus()
+            threading.Thread(target=_run, args=(path, status),
+                             name='currycompany-warmup', daemon=True).start()
+
+        return status
@@ -0,0 +1,71 @@
+""" Observador do csv que incorpora as linhas novas em segundo plano.
+
+    Sem o observador, as linhas novas são lidas na primeira interação depois
+    da mudança do arquivo. Com ele (CURRYCOMPANY_WATCH > 0), uma thread
+    verifica periodicamente o mtime e o tamanho do csv e atualiza o cache
+    (e, com o backend 'sqlite', o arquivo SQLite) antes que alguma sessão
+    precise dele.
+"""
+# libraries
+import logging
+import os
+import threading
+import time
+
+from currycompany import config, data, sqlbackend, streaming
+from currycompany.data import DATASET_PATH, source_signature
+
+logger = logging.getLogger('currycompany.watch')
+
+# caminho absoluto -> thread do observador
+_watchers = {}
+_lock = threading.Lock()
+
+
+def _watch(path, interval):
+    last = None
+    while True:
+        time.sleep(interval)
+
+        try:
+            signature = source_signature(path)
+        except OSError:
+            continue
+
+        if signature == last:
+            continue
+
+        try:
+            if config.INGEST_MODE == 'stream':
+                streaming.refresh(path)
+            else:
+                data.refresh(path)
+            if config.QUERY_BACKEND == 'sqlite':
+                sqlbackend.refresh(path)
+        except Exception:
+            # uma falha (ex.: linha malformada) não para o observador; a
+            # próxima sessão tenta ler as mudanças de novo
+            logger.exception('falha ao incorporar as mudanças de %s', path)
+        last = signature
+
+
+def ensure_watcher(path=DATASET_PATH, interval=None):
+    """ Inicia (uma única vez por processo) o observador do csv.
+
+        Imput: caminho do csv, intervalo em segundos (padrão: config)
+        Output: a thread do observador, ou None se estiver desligado
+    """
+    interval = config.WATCH_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return None
+
+    key = os.path.abspath(path)
+    with _lock:
+        thread = _watchers.get(key)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_watch, args=(path, interval),
+                                      name='currycompany-watch', daemon=True)
+            thread.start()
+            _watchers[key] = thread
+
+        return thread
@@ -1,161 +1,93 @@
 # libraries
-from haversine import haversine
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
-import re
 import streamlit as st
+import streamlit.components.v1 as components
 import datetime
-import folium
-from streamlit_folium import folium_static
 
-from PIL import Image # aqui importamos a biblioteca para colocar imagens no streamlit
+from currycompany.cache import cached_view
+from currycompany.instrument import show_panel, stage
+from currycompany.lazy import lazy_import
+from currycompany.maps import MAP_MODES, map_html
+from currycompany.page import page_setup
+from currycompany.reports import get_report, get_reports
+from currycompany.timeseries import BUCKET_LABELS
+
+# plotly só é importado quando um gráfico é montado (ver lazy)
+px = lazy_import('plotly.express')
 
 
 st.set_page_config(page_title='Visão Empresa', layout='wide')
 
+page_setup('1_visao_empresa')
+
 # ---------------------------------------
 # Funções
 # ---------------------------------------
-def country_maps(df1):
+def period_label(df_aux):
+    # rótulo do eixo x das séries de datas: o período usado (dia, semana, ...)
+    bucket = df_aux['bucket'].iloc[0] if len(df_aux) else 'day'
+
+    return {'period': BUCKET_LABELS[bucket]}
+
+def country_maps(date_limit, filtros, modo):
             
-    df_aux = (df1.loc[:, ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude' ]]
-                 .groupby(['City', 'Road_traffic_density']).median().reset_index())
-    map = folium.Map()
-    
-    for index, location_info in df_aux.iterrows():
-        folium.Marker([location_info['Delivery_location_latitude'],
-                       location_info['Delivery_location_longitude']],
-                       popup=location_info[['City', 'Road_traffic_density']]).add_to(map)
+    # O HTML do mapa fica em cache por versão do dataset e estado dos filtros
+    html = map_html(date_limit, filtros, MAP_MODES[modo])
     
-    folium_static(map, width=1024, height=600)
+    components.html(html, width=1024, height=610)
 
-def order_share_by_week(df1):
+@cached_view
+def order_share_by_week(date_limit, filtros):
             
-    df_aux01 = df1.loc[:,['week_of_year']].groupby('week_of_year').count().reset_index()
-    df_aux02 = df1.loc[:, ['Delivery_person_ID', 'week_of_year']].groupby('week_of_year').nunique().reset_index()
-    
-    df_aux = pd.merge(df_aux01, df_aux02, how='inner', on='week_of_year')
-    df_aux['order_by_deliver'] = df_aux['Delivery_person_ID']
+    # entregadores únicos por semana, ou por período maior em históricos
+    # longos (ver currycompany.reports)
+    df_aux = get_report('riders_by_week', date_limit, filtros)
     
-    fig = px.line(df_aux, x='week_of_year', y='order_by_deliver')
+    fig = px.line(df_aux, x='period', y='order_by_deliver', labels=period_label(df_aux))
     
     return fig
 
-def order_by_week(df1):
+@cached_view
+def order_by_week(date_limit, filtros):
         
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime('%U')
-    df_aux = df1.loc[:, ['ID', 'week_of_year']].groupby('week_of_year').count().reset_index()
-    fig = px.line(df_aux, x='week_of_year', y='ID')
+    df_aux = get_report('orders_by_week', date_limit, filtros)
+    fig = px.line(df_aux, x='period', y='ID', labels=period_label(df_aux))
 
     return fig
 
-def traffic_order_city(df1):    
-    df_aux = df1.loc[:, ['ID', 'City', 'Road_traffic_density']].groupby(['City', 'Road_traffic_density']).count().reset_index()
+@cached_view
+def traffic_order_city(date_limit, filtros):    
+    df_aux = get_report('traffic_order_city', date_limit, filtros)
     fig = px.scatter(df_aux, x='City', y='Road_traffic_density', size='ID', color='City')
 
     return fig
 
-def traffic_order_share(df1):
+@cached_view
+def traffic_order_share(date_limit, filtros):
             
-    df_aux = df1.loc[:, ['ID', 'Road_traffic_density']].groupby('Road_traffic_density').count().reset_index()
-    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
+    df_aux = get_report('traffic_order_share', date_limit, filtros)
     
     fig = px.pie( df_aux, values='entregas_perc', names='Road_traffic_density')
     
     return fig
 
-def order_metric(df1):
-    # Oder Metric
+@cached_view
+def order_metric(date_limit, filtros):
+    # Oder Metric ( contagem de pedidos por dia )
     
-    df_aux = df1.loc[:, ['ID', 'Order_Date']].groupby( 'Order_Date' ).count().reset_index()
-    df_aux.columns = ['order_date', 'qtde_entregas']
+    df_aux = get_report('orders_by_date', date_limit, filtros)
     
     # criei uma variavel fig para colocar dentro da propriedade plotly
-    fig = px.bar( df_aux, x='order_date', y='qtde_entregas' )
+    # (um pedido por dia, ou por período maior em históricos longos)
+    fig = px.bar( df_aux, x='period', y='qtde_entregas', labels=period_label(df_aux))
     
     return fig
 
 
 
-def clean_code(df):
-    """ Esta função tem a responsabilibsade de limpar o dataframe
-    
-        Tipos de limpeza:
-        1. Remoção dos dados NaN
-        2. Mudança do tipo de coluna de dados
-        3. Remoção dos espaços das variáveis de texto
-        4. Formatação da coluna de datas
-        5. Limpeza da coluna de tempo ( remoção do texto da variável numérica)
-
-        Imput: dataframe
-        Output: dataframe
-    """
-    # Remover spaco da string
-    df['ID'] = df['ID'].str.strip()
-    df['Delivery_person_ID'] = df['Delivery_person_ID'].str.strip()
-    
-    # Excluir as linhas com a idade dos entregadores vazia
-    # ( Conceitos de seleção condicional )
-    linhas_vazias = df['Delivery_person_Age'] != 'NaN '
-    df = df.loc[linhas_vazias, :]
-    
-    linhas_vazias = df['Road_traffic_density'] != 'NaN '
-    df = df.loc[linhas_vazias, :]
-    
-    linhas_vazias = df['City'] != 'NaN '
-    df = df.loc[linhas_vazias, :]
-    
-    linhas_vazias = df['Festival'] != 'NaN '
-    df = df.loc[linhas_vazias, :]
-    
-    # Conversao de texto/categoria/string para numeros inteiros
-    df['Delivery_person_Age'] = df['Delivery_person_Age'].astype( int )
-    
-    # Conversao de texto/categoria/strings para numeros decimais
-    df['Delivery_person_Ratings'] = df['Delivery_person_Ratings'].astype( float )
-    
-    # Conversao de texto para data
-    df['Order_Date'] = pd.to_datetime( df['Order_Date'], format='%d-%m-%Y' )
-    
-    # Remove as linhas da culuna multiple_deliveries que tenham o
-    # conteudo igual a 'NaN '
-    linhas_vazias = df['multiple_deliveries'] != 'NaN '
-    df = df.loc[linhas_vazias, :]
-    df['multiple_deliveries'] = df['multiple_deliveries'].astype( int )
-    
-    # Comando para remover o texto de números
-    df = df.reset_index( drop=True )
-    
-    # Retirando os numeros da coluna Time_taken(min)
-    df['Time_taken(min)'] = df['Time_taken(min)'].apply(lambda x: re.findall( r'\d+', x))
-    
-    # Retirando os espaços da coluna Festival
-    df['Festival'] = df['Festival'].str.strip()
-
-    return df
 # -------------------------------- 
 # Inicio da Estrutura 
 # -------------------------------
 
-# ---------------------------------------
-# Lendo e copiando DataFrame
-# ---------------------------------------
-
-df_raw = pd. read_csv('dataset/train.csv')
-df = df_raw.copy()
-
-# --------------------------------------
-# Limpando o dataframe
-# --------------------------------------
-df = clean_code(df)
-
-# -------------------------------------
-# Copia do df
-# -------------------------------------
-
-df1 = df.copy()
-
 # -------------------------------------
 # Barra Lateral
 # -------------------------------------
@@ -182,26 +114,22 @@ traffic_options = st.sidebar.multiselect(
 
 st.sidebar.markdown("""---""")
 
-# Filtro de Data
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
-
-# Filtro de Transito
-#linhas_selecionadas = df1['Road_traffic_density'].isin(traffic_options)
-#df1 = df1.loc[linhas_selecionadas, :]
+# Filtros de Data e de Transito
+filtros = {'Road_traffic_density': traffic_options}
 
 # ----------------------------------------
 # Layout no Streamlit
 # ----------------------------------------
 
-# Criando os menus
-
-tab1, tab2, tab3 = st.tabs(['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'])
+# Cada visão é uma função: só a visão selecionada é calculada e desenhada
+# (com st.tabs todas as abas seriam executadas a cada interação). As
+# figuras ficam em cache por estado dos filtros, compartilhado entre sessões
 
+def visao_gerencial(date_limit, filtros):
+    get_reports(['orders_by_date', 'traffic_order_share', 'traffic_order_city'], date_limit, filtros)
 
-with tab1:
     with st.container():
-        fig = order_metric(df1)
+        fig = order_metric(date_limit, filtros)
         st.header('Orders By Date')
         # Plotly é uma propriedade do strealit para poder exibir o gráfico
         st.plotly_chart(fig, use_container_width=True)
@@ -213,49 +141,49 @@ with tab1:
 
 
     with col1:
-        fig = traffic_order_share(df1)
+        fig = traffic_order_share(date_limit, filtros)
         st.header('Traffic Order Share')
         st.plotly_chart(fig, use_container_width=True)
 
 
     with col2:
-        fig = traffic_order_city(df1)
+        fig = traffic_order_city(date_limit, filtros)
         st.header('Traffic Order City')
         st.plotly_chart(fig, use_container_width=True)
 
 
-with tab2:
+def visao_tatica(date_limit, filtros):
+    get_reports(['orders_by_week', 'riders_by_week'], date_limit, filtros)
+
     with st.container():
-        fig = order_by_week(df1)
+        fig = order_by_week(date_limit, filtros)
         st.header('Order By Week')
         st.plotly_chart(fig, use_container_width=True)
 
 
     with st.container():
-        fig = order_share_by_week(df1)
+        fig = order_share_by_week(date_limit, filtros)
         st.header('Order Share By Week')
         st.plotly_chart(fig, use_container_width=True)
 
 
-with tab3:
+def visao_geografica(date_limit, filtros):
     with st.container():
         st.header('Country Maps')
-        country_maps(df1)
-
-        
-
-        
-
-
-
-
-
-
-
-
-
+        modo = st.radio('Exibir', list(MAP_MODES), horizontal=True)
+        country_maps(date_limit, filtros, modo)
 
 
+# Criando os menus
 
+visoes = {
+    'Visão Gerencial': visao_gerencial,
+    'Visão Tática': visao_tatica,
+    'Visão Geográfica': visao_geografica,
+}
 
+visao = st.radio('Visão', list(visoes), horizontal=True, label_visibility='collapsed')
+with stage('view:' + visao):
+    visoes[visao](date_slider, filtros)
 
+show_panel()